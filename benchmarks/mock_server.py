@@ -0,0 +1,348 @@
+"""
+Local stand-in for the Kobo API (v2) serving synthetic forms, used by the benchmarks.
+
+It implements the endpoints used by pykobo: the list of assets (paginated), the asset of
+a form with its content, the submissions (paginated with `start`/`limit`), the media files
+of a form and the files attached to the submissions. The number of requests received is
+counted per endpoint.
+"""
+
+import json
+import random
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+# Number of submissions per page when the request has no `limit`
+DEFAULT_LIMIT = 1000
+
+
+class SyntheticForm:
+    """
+    A form with `nb_rows` submissions. The survey has `nb_selects` questions of type
+    'select_one' (sharing the same list of `nb_choices` choices), a question of type
+    'select_multiple', `nb_geopoints` geopoints and, if `repeat_depth` > 0, repeat groups
+    nested `repeat_depth` levels deep with `nb_children` children per parent. If
+    `nb_attachments` > 0, each submission has `nb_attachments` attached photos of
+    `attachment_size` bytes.
+    """
+
+    def __init__(
+        self,
+        uid: str,
+        nb_rows: int = 1000,
+        nb_selects: int = 5,
+        nb_choices: int = 10,
+        nb_geopoints: int = 1,
+        repeat_depth: int = 1,
+        nb_children: int = 2,
+        nb_attachments: int = 0,
+        attachment_size: int = 1024,
+        seed: int = 0,
+    ) -> None:
+        self.uid = uid
+        self.nb_rows = nb_rows
+        self.nb_selects = nb_selects
+        self.nb_choices = nb_choices
+        self.nb_geopoints = nb_geopoints
+        self.repeat_depth = repeat_depth
+        self.nb_children = nb_children
+        self.nb_attachments = nb_attachments
+        self.attachment_size = attachment_size
+        self.seed = seed
+        self._submissions = None
+
+    def metadata(self, base_url: str) -> dict:
+        """The asset as returned in the list of assets (without its content)."""
+        return {
+            "uid": self.uid,
+            "name": f"Synthetic form {self.uid}",
+            "asset_type": "survey",
+            "owner__username": "benchmark",
+            "date_created": "2022-12-05T14:36:19.800395Z",
+            "date_modified": "2022-12-05T14:42:03.913134Z",
+            "version_id": f"v{self.uid}",
+            "has_deployment": True,
+            "deployment__submission_count": self.nb_rows,
+            "summary": {"geo": self.nb_geopoints > 0},
+            "url": f"{base_url}/api/v2/assets/{self.uid}.json",
+            "data": f"{base_url}/api/v2/assets/{self.uid}/data.json",
+        }
+
+    def asset(self, base_url: str) -> dict:
+        survey = [
+            {"type": "start", "name": "start", "$autoname": "start"},
+            {"type": "begin_group", "name": "main", "$autoname": "main"},
+            {"type": "integer", "name": "age", "$autoname": "age", "label": ["Age"]},
+            {
+                "type": "decimal",
+                "name": "weight",
+                "$autoname": "weight",
+                "label": ["Weight"],
+            },
+            {"type": "date", "name": "visit", "$autoname": "visit", "label": ["Visit"]},
+            {
+                "type": "text",
+                "name": "comment",
+                "$autoname": "comment",
+                "label": ["Comment"],
+            },
+        ]
+        for i in range(self.nb_selects):
+            survey.append(
+                {
+                    "type": "select_one",
+                    "name": f"select_{i}",
+                    "$autoname": f"select_{i}",
+                    "label": [f"Select {i}"],
+                    "select_from_list_name": "options",
+                }
+            )
+        survey.append(
+            {
+                "type": "select_multiple",
+                "name": "items",
+                "$autoname": "items",
+                "label": ["Items"],
+                "select_from_list_name": "options",
+            }
+        )
+        for i in range(self.nb_geopoints):
+            survey.append(
+                {
+                    "type": "geopoint",
+                    "name": f"gps_{i}",
+                    "$autoname": f"gps_{i}",
+                    "label": [f"GPS {i}"],
+                }
+            )
+        if self.nb_attachments > 0:
+            survey.append(
+                {
+                    "type": "image",
+                    "name": "photo",
+                    "$autoname": "photo",
+                    "label": ["Photo"],
+                }
+            )
+        survey.append({"type": "end_group"})
+
+        for depth in range(1, self.repeat_depth + 1):
+            survey += [
+                {
+                    "type": "begin_repeat",
+                    "name": f"repeat_{depth}",
+                    "$autoname": f"repeat_{depth}",
+                    "label": [f"Repeat {depth}"],
+                },
+                {
+                    "type": "text",
+                    "name": f"name_{depth}",
+                    "$autoname": f"name_{depth}",
+                    "label": [f"Name {depth}"],
+                },
+                {
+                    "type": "select_one",
+                    "name": f"choice_{depth}",
+                    "$autoname": f"choice_{depth}",
+                    "label": [f"Choice {depth}"],
+                    "select_from_list_name": "options",
+                },
+            ]
+        survey += [{"type": "end_repeat"}] * self.repeat_depth
+
+        choices = [
+            {"list_name": "options", "name": f"option_{i}", "label": [f"Option {i}"]}
+            for i in range(self.nb_choices)
+        ]
+
+        asset = self.metadata(base_url)
+        asset["content"] = {"survey": survey, "choices": choices}
+        return asset
+
+    def submissions(self, base_url: str) -> list:
+        """The submissions, generated the first time they are requested."""
+        if self._submissions is None:
+            rng = random.Random(self.seed)
+            self._submissions = [
+                self._submission(rng, base_url, i) for i in range(self.nb_rows)
+            ]
+        return self._submissions
+
+    def _submission(self, rng: random.Random, base_url: str, i: int) -> dict:
+        options = [f"option_{c}" for c in range(self.nb_choices)]
+        submission = {
+            "_id": i + 1,
+            "start": "2022-12-05T14:36:19.800+01:00",
+            "main/age": str(rng.randint(18, 90)),
+            "main/weight": f"{rng.uniform(40, 120):.1f}",
+            "main/visit": f"2022-12-{rng.randint(1, 28):02d}",
+            "main/comment": f"Comment number {i}",
+            "main/items": " ".join(rng.sample(options, min(3, len(options)))),
+            "_submission_time": f"2022-12-{i % 28 + 1:02d}T10:{i % 60:02d}:00",
+            "_attachments": [],
+        }
+        for s in range(self.nb_selects):
+            submission[f"main/select_{s}"] = rng.choice(options)
+        for g in range(self.nb_geopoints):
+            lat, lon = rng.uniform(-90, 90), rng.uniform(-180, 180)
+            submission[f"main/gps_{g}"] = f"{lat:.6f} {lon:.6f} 100 5"
+        for a in range(self.nb_attachments):
+            filename = f"photo_{i}_{a}.jpg"
+            if a == 0:
+                submission["main/photo"] = filename
+            submission["_attachments"].append(
+                {
+                    "filename": f"benchmark/attachments/{self.uid}/{filename}",
+                    "download_url": f"{base_url}/media/{self.uid}/{filename}",
+                    "mimetype": "image/jpeg",
+                }
+            )
+        if self.repeat_depth > 0:
+            submission.update(self._children(rng, 1, "", options))
+        return submission
+
+    def _children(self, rng: random.Random, depth: int, prefix: str, options: list):
+        path = f"{prefix}repeat_{depth}"
+        children = []
+        for c in range(self.nb_children):
+            child = {
+                f"{path}/name_{depth}": f"Child {c}",
+                f"{path}/choice_{depth}": rng.choice(options),
+            }
+            if depth < self.repeat_depth:
+                child.update(self._children(rng, depth + 1, f"{path}/", options))
+            children.append(child)
+        return {f"{path}_count": str(len(children)), path: children}
+
+
+class MockKoboServer:
+    """
+    HTTP server serving `forms` (a list of `SyntheticForm`) on `127.0.0.1`, in a
+    background thread. `counts` is the number of requests received per endpoint
+    ('assets', 'asset', 'data', 'files', 'media').
+    """
+
+    def __init__(self, forms: list) -> None:
+        self.forms = {form.uid: form for form in forms}
+        self.counts = Counter()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _handler(self))
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def count(self, endpoint: str) -> None:
+        with self._lock:
+            self.counts[endpoint] += 1
+
+    def route(self, path: str, params: dict):
+        """Return the endpoint and the body of the response (`None` if not found)."""
+        parts = path.strip("/").split("/")
+
+        if parts[:2] == ["api", "v2"] and parts[2:] == ["assets.json"]:
+            assets = [form.metadata(self.url) for form in self.forms.values()]
+            return "assets", self._page(assets, path, params)
+
+        if parts[:3] == ["api", "v2", "assets"] and len(parts) == 4:
+            form = self.forms.get(parts[3][: -len(".json")])
+            return "asset", form.asset(self.url) if form else None
+
+        if parts[:3] == ["api", "v2", "assets"] and len(parts) == 5:
+            form = self.forms.get(parts[3])
+            if form is None:
+                return parts[4], None
+            if parts[4] == "data.json":
+                return "data", self._page(form.submissions(self.url), path, params)
+            if parts[4] == "files":
+                return "files", {"results": self._files(form)}
+
+        return "unknown", None
+
+    def _page(self, results: list, path: str, params: dict) -> dict:
+        start = int(params.get("start", 0))
+        limit = int(params.get("limit", DEFAULT_LIMIT))
+        end = start + limit
+
+        next_url = None
+        if end < len(results):
+            query = dict(params, start=end, limit=limit)
+            next_url = f"{self.url}{path}?" + "&".join(
+                f"{k}={v}" for k, v in query.items()
+            )
+
+        return {"count": len(results), "next": next_url, "results": results[start:end]}
+
+    def _files(self, form: SyntheticForm) -> list:
+        return [
+            {
+                "uid": f"file{i}",
+                "file_type": "form_media",
+                "metadata": {
+                    "hash": f"md5:{i:032d}",
+                    "filename": f"media_{i}.csv",
+                    "mimetype": "text/csv",
+                },
+            }
+            for i in range(3)
+        ]
+
+
+def _handler(server: MockKoboServer):
+    class Handler(BaseHTTPRequestHandler):
+        # Keep the connections alive as the Kobo server does
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url = urlparse(self.path)
+
+            if url.path.startswith("/media/"):
+                server.count("media")
+                form = server.forms.get(url.path.split("/")[2])
+                if form is None:
+                    return self._send(404, b"")
+                return self._send(200, b"x" * form.attachment_size, "image/jpeg")
+
+            endpoint, body = server.route(url.path, dict(parse_qsl(url.query)))
+            server.count(endpoint)
+            if body is None:
+                return self._send(404, b"")
+
+            self._send(200, json.dumps(body).encode(), "application/json")
+
+        def do_HEAD(self):
+            self.do_GET()
+
+        def _send(self, status: int, body: bytes, content_type: str = None):
+            self.send_response(status)
+            if content_type is not None:
+                self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
@@ -0,0 +1,155 @@
+"""
+Benchmarks of pykobo against a local mock of the Kobo API (see `mock_server.py`).
+
+For each operation, print the wall time (best of `--repeat` runs), the peak of memory
+allocated by Python (measured on an extra run with `tracemalloc`) and the number of
+requests sent to the server (during one run). Run from the root of the repository:
+
+    python -m benchmarks.run --rows 20000 --selects 10 --repeat-depth 2 --attachments 1
+
+With `--output results.json`, the results are also saved to a JSON file so two versions
+of pykobo can be compared.
+"""
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+from pykobo import Manager
+from pykobo.schema import SCHEMAS
+
+from .mock_server import MockKoboServer, SyntheticForm
+
+
+def measure(server: MockKoboServer, setup, run, repeat: int) -> dict:
+    """Measure `run(setup())`. `setup` prepares a fresh state for each run
+    and isn't measured."""
+    times = []
+    requests = None
+    for _ in range(repeat):
+        state = setup()
+        before = sum(server.counts.values())
+        start = time.perf_counter()
+        run(state)
+        times.append(time.perf_counter() - start)
+        if requests is None:
+            requests = sum(server.counts.values()) - before
+
+    state = setup()
+    tracemalloc.start()
+    run(state)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"time": min(times), "peak_memory": peak, "requests": requests}
+
+
+def benchmarks(server: MockKoboServer, uid: str, page_size: int) -> dict:
+    """The operations measured, as (setup, run) by name."""
+
+    def manager() -> Manager:
+        return Manager(url=server.url, api_version=2, token="benchmark")
+
+    def new_form(clear_schemas: bool = True):
+        if clear_schemas:
+            SCHEMAS.clear()
+        return manager().get_form(uid)
+
+    # A form whose data have been fetched, used by the operations on the data
+    fetched = new_form()
+    fetched.fetch_data(page_size=page_size)
+    data, repeats = fetched.data, fetched.repeats
+
+    def with_data():
+        fetched.display(columns_as="name", choices_as="name")
+        fetched.data = data.copy()
+        return fetched
+
+    def raw_data():
+        # The data before the columns of the geopoints are added
+        columns = [c for c in data.columns if not c.startswith("_gps_")]
+        return data[columns].copy(), {k: v.copy() for k, v in repeats.items()}
+
+    return {
+        "Manager.get_forms": (manager, lambda km: km.get_forms()),
+        "KoboForm.fetch_data": (
+            new_form,
+            lambda form: form.fetch_data(page_size=page_size),
+        ),
+        "KoboForm.fetch_data (cached schema)": (
+            lambda: new_form(clear_schemas=False),
+            lambda form: form.fetch_data(page_size=page_size),
+        ),
+        "KoboForm.iter_batches": (
+            new_form,
+            lambda form: sum(len(data) for data, _ in form.iter_batches(page_size)),
+        ),
+        "KoboForm.display": (
+            with_data,
+            lambda form: form.display(columns_as="label", choices_as="label"),
+        ),
+        "KoboForm.fetch_attachments": (
+            with_data,
+            lambda form: form.fetch_attachments(["photo"])
+            if "photo" in form.data.columns
+            else None,
+        ),
+        "KoboForm._split_gps_coords": (
+            raw_data,
+            lambda frames: fetched._split_gps_coords(*frames),
+        ),
+    }
+
+
+def main(argv: list = None) -> dict:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--forms", type=int, default=10, help="number of forms")
+    parser.add_argument("--rows", type=int, default=10000, help="submissions per form")
+    parser.add_argument("--selects", type=int, default=5, help="select_one questions")
+    parser.add_argument("--choices", type=int, default=10, help="choices per list")
+    parser.add_argument("--geopoints", type=int, default=1, help="geopoint questions")
+    parser.add_argument("--repeat-depth", type=int, default=1, help="nested repeats")
+    parser.add_argument("--children", type=int, default=2, help="children per repeat")
+    parser.add_argument("--attachments", type=int, default=1, help="files per row")
+    parser.add_argument("--page-size", type=int, default=1000, help="rows per page")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark")
+    parser.add_argument("--output", help="JSON file where the results are saved")
+    args = parser.parse_args(argv)
+
+    forms = [
+        SyntheticForm(
+            f"form{i}",
+            nb_rows=args.rows,
+            nb_selects=args.selects,
+            nb_choices=args.choices,
+            nb_geopoints=args.geopoints,
+            repeat_depth=args.repeat_depth,
+            nb_children=args.children,
+            nb_attachments=args.attachments,
+        )
+        for i in range(args.forms)
+    ]
+
+    results = {}
+    with MockKoboServer(forms) as server:
+        operations = benchmarks(server, forms[0].uid, args.page_size)
+        print(f"{'benchmark':<40} {'time (s)':>10} {'peak (MB)':>10} {'requests':>9}")
+        for name, (setup, run) in operations.items():
+            result = measure(server, setup, run, args.repeat)
+            results[name] = result
+            print(
+                f"{name:<40} {result['time']:>10.3f} "
+                f"{result['peak_memory'] / 1024**2:>10.1f} {result['requests']:>9}"
+            )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"parameters": vars(args), "results": results}, f, indent=2)
+
+    return results
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,2 +1,3 @@
 from .__version__ import __license__, __title__, __version__
+from .aio import AsyncManager
 from .manager import Manager
@@ -0,0 +1,478 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Union
+
+import pandas as pd
+
+from .form import DEFAULT_PAGE_SIZE, KoboForm
+from .session import RETRY_STATUS_CODES
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None
+
+
+async def _get(
+    client,
+    url: str,
+    headers: dict,
+    params: dict = None,
+    max_retries: int = 3,
+    backoff_factor: float = 0.5,
+):
+    """Send a GET request with `client`. As with the session of `Manager`, the requests
+    failing with one of the status codes in `RETRY_STATUS_CODES` are retried up to `max_retries`
+    times, waiting `backoff_factor * 2 ** (retry - 1)` seconds between two retries."""
+    retry = 0
+    while True:
+        res = await client.get(url, headers=headers, params=params)
+        if res.status_code not in RETRY_STATUS_CODES or retry >= max_retries:
+            return res
+        retry += 1
+        await asyncio.sleep(backoff_factor * 2 ** (retry - 1))
+
+
+class AsyncKoboForm(KoboForm):
+    """Same as `KoboForm` but the methods sending requests to the server are coroutines.
+    The requests are sent with an `httpx.AsyncClient`, shared with the `AsyncManager`
+    that created the form."""
+
+    def __init__(self, uid: str, client=None) -> None:
+        if httpx is None:
+            raise ImportError("AsyncKoboForm requires the package 'httpx'.")
+
+        if client is None:
+            client = httpx.AsyncClient(timeout=None)
+
+        super().__init__(uid, session=client)
+        self.max_retries = 3
+        self.backoff_factor = 0.5
+
+    def __repr__(self):
+        return f"AsyncKoboForm('{self.uid}')"
+
+    async def fetch_data(
+        self,
+        page_size: int = None,
+        categorical: bool = False,
+        one_hot: bool = False,
+        coerce_types: bool = False,
+        dtype_backend: str = "numpy",
+        fields: list = None,
+        query: dict = None,
+    ) -> Union[pd.DataFrame, dict]:
+        """Fetch the form's data and store them as a Pandas DF in the attribute `data`.
+        See `KoboForm.fetch_data`."""
+
+        self._set_options(categorical, one_hot, coerce_types, dtype_backend)
+
+        await self._aprepare_schema()
+        params = self._data_params(fields, query)
+
+        pages = []
+        repeats = {}
+        nb_rows = 0
+        fetched = False
+        async for page in self._aiter_pages(page_size, params):
+            fetched = True
+            df_page = self._process_page(page, nb_rows, repeats)
+            nb_rows += len(df_page)
+            pages.append(df_page)
+
+        # If error while fetching the data, return an empty DF
+        if not fetched:
+            return pd.DataFrame()
+
+        self._set_data(*self._build_frames(pages, repeats))
+
+    async def iter_batches(
+        self,
+        batch_size: int = DEFAULT_PAGE_SIZE,
+        categorical: bool = False,
+        one_hot: bool = False,
+        coerce_types: bool = False,
+        dtype_backend: str = "numpy",
+        fields: list = None,
+        query: dict = None,
+    ):
+        """Fetch the form's data by batches of `batch_size` submissions and yield each batch
+        as a tuple (DF of the data, dict of the DFs of the repeat groups).
+        See `KoboForm.iter_batches`."""
+
+        self._set_options(categorical, one_hot, coerce_types, dtype_backend)
+        self._check_page_size(batch_size)
+
+        await self._aprepare_schema()
+        params = self._data_params(fields, query)
+
+        offsets = {}
+        async for page in self._aiter_pages(batch_size, params):
+            repeats = {}
+            df_page = self._process_page(page, 0, repeats)
+            if len(df_page) == 0:
+                continue
+
+            data, repeats = self._build_frames([df_page], repeats)
+            self._shift_indices(data, repeats, offsets)
+
+            yield data, repeats
+
+    async def fetch_new_data(
+        self, since=None, watermark: str = "_submission_time", page_size: int = None
+    ):
+        """Fetch only the submissions newer than `since` and merge them into `data`.
+        Return the new watermark. See `KoboForm.fetch_new_data`."""
+
+        await self._aprepare_schema()
+
+        params = self._new_data_params(since, watermark)
+
+        pages = []
+        repeats = {}
+        nb_rows = 0
+        async for page in self._aiter_pages(page_size, params):
+            df_page = self._process_page(page, nb_rows, repeats)
+            nb_rows += len(df_page)
+            pages.append(df_page)
+
+        return self._add_new_data(pages, repeats, since, watermark)
+
+    async def download_attachments(
+        self,
+        directory: str,
+        rows: pd.Series = None,
+        max_workers: int = 4,
+        chunk_size: int = 1024 * 1024,
+    ) -> pd.DataFrame:
+        """Download the files attached to the submissions in the folder `directory`, at most
+        `max_workers` at the same time. See `KoboForm.download_attachments`."""
+
+        manifest = self._attachments_manifest(directory, rows)
+        semaphore = asyncio.Semaphore(max_workers)
+
+        async def download(url: str, path: str) -> tuple:
+            async with semaphore:
+                return await self._adownload_attachment(url, path, chunk_size)
+
+        results = await asyncio.gather(
+            *[
+                download(url, path)
+                for url, path in zip(manifest["download_url"], manifest["path"])
+            ]
+        )
+        self._set_download_results(manifest, results)
+
+        return manifest
+
+    async def _adownload_attachment(
+        self, url: str, path: str, chunk_size: int
+    ) -> tuple:
+        """Download the file at `url` to `path`. See `KoboForm._download_attachment`."""
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            if os.path.exists(path):
+                res = await self.session.head(
+                    url, headers=self.headers, follow_redirects=True
+                )
+                res.raise_for_status()
+                size = res.headers.get("Content-Length")
+                if size is not None and int(size) == os.path.getsize(path):
+                    return os.path.getsize(path), "skipped"
+
+            part = f"{path}.part"
+            headers = dict(self.headers or {})
+            downloaded = os.path.getsize(part) if os.path.exists(part) else 0
+            if downloaded > 0:
+                headers["Range"] = f"bytes={downloaded}-"
+
+            async with self.session.stream(
+                "GET", url, headers=headers, follow_redirects=True
+            ) as res:
+                unsatisfiable = res.status_code == 416 and downloaded > 0
+                if not unsatisfiable:
+                    resumed = await self._awrite_part(res, part, downloaded, chunk_size)
+
+            if unsatisfiable:
+                # The file was complete but not renamed yet. Otherwise, it's downloaded again
+                size = res.headers.get("Content-Range", "").rpartition("/")[2]
+                if size == str(downloaded):
+                    os.replace(part, path)
+                    return downloaded, "resumed"
+                headers.pop("Range")
+                async with self.session.stream(
+                    "GET", url, headers=headers, follow_redirects=True
+                ) as res:
+                    resumed = await self._awrite_part(res, part, 0, chunk_size)
+
+            os.replace(part, path)
+        except (httpx.HTTPError, OSError) as e:
+            logging.error(f"Unable to download {url}: {e}")
+            return None, "failed"
+
+        return os.path.getsize(path), "resumed" if resumed else "downloaded"
+
+    async def _awrite_part(
+        self, res, part: str, downloaded: int, chunk_size: int
+    ) -> bool:
+        """Write the body of the response `res` to the file `part`, after the `downloaded`
+        bytes already in it if the server sent only the rest of the file. Return whether
+        the download was resumed."""
+        res.raise_for_status()
+        resumed = downloaded > 0 and res.status_code == 206
+        with open(part, "ab" if resumed else "wb") as f:
+            async for chunk in res.aiter_bytes(chunk_size):
+                f.write(chunk)
+
+        return resumed
+
+    async def fetch_media(self):
+        """Fetch the form's media files and store them as a Pandas DF in the attribute `media`."""
+        media_url = f"{self.base_url}/{self.uid}/files/?format=json"
+        res = await self._get(media_url)
+        self.media = self._build_media(res.json()["results"])
+
+    async def download_form(self, format: str) -> None:
+        """Given the uid of a form and a format ('xls' or 'xml')
+        download the form in that format in the current directory"""
+
+        URL = self._form_url(format)
+        filename = URL.split("/")[-1]
+
+        r = await self._get(URL)
+
+        with open(filename, "wb") as f:
+            f.write(r.content)
+
+    async def _afetch_asset(self):
+        res = await self._get(self.url_asset)
+        self._load_asset(res.json())
+
+    async def _aprepare_schema(self) -> None:
+        """Build the structure of the form, fetching the asset only if the structure of its
+        version isn't in `SCHEMAS`. See `KoboForm._prepare_schema`."""
+        if self._lookup_schema():
+            return
+
+        if not self._has_asset():
+            await self._afetch_asset()
+
+        self._compile_schema()
+
+    async def _aiter_pages(self, page_size: int = None, params: dict = None):
+        """Yield the submissions of the form one page at a time. See `KoboForm._iter_pages`."""
+
+        url = self.url_data
+        params = dict(params or {})
+        if page_size is not None:
+            self._check_page_size(page_size)
+            params.update({"start": 0, "limit": page_size})
+        if not params:
+            params = None
+
+        first_page = True
+        while url:
+            res = await self._get(url, params)
+
+            if res.status_code != 200:
+                if first_page:
+                    return
+                res.raise_for_status()
+
+            content = res.json()
+            results = content["results"]
+
+            yield results
+
+            if len(results) == 0:
+                return
+
+            first_page = False
+            url = content.get("next")
+            params = None
+
+    async def _get(self, url: str, params: dict = None):
+        return await _get(
+            self.session,
+            url,
+            self.headers,
+            params,
+            self.max_retries,
+            self.backoff_factor,
+        )
+
+
+class AsyncManager:
+    """Same as `Manager` (for the methods fetching the forms) but the methods sending requests
+    to the server are coroutines, so the data of many forms can be fetched concurrently
+    from the same event loop:
+
+        async with AsyncManager(url, 2, token) as km:
+            forms = await km.get_forms()
+            await asyncio.gather(*[f.fetch_data() for f in forms])
+    """
+
+    def __init__(
+        self,
+        url: str,
+        api_version: int,
+        token: str,
+        max_connections: int = 10,
+        max_retries: int = 3,
+        backoff_factor: float = 0.5,
+        timeout: float = None,
+        forms_page_size: int = 100,
+        forms_ttl: float = 300,
+    ) -> None:
+        if httpx is None:
+            raise ImportError("AsyncManager requires the package 'httpx'.")
+
+        if api_version != 2:
+            raise ValueError("The value of 'api_version' has to be: 2.")
+
+        self.url = url.rstrip("/")
+        self.api_version = api_version
+        self.token = token
+        self.headers = {"Authorization": f"Token {token}"}
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.forms_page_size = forms_page_size
+        self.forms_ttl = forms_ttl
+        self._assets = None
+        self._assets_fetched_at = None
+        # Client shared by the manager and all the forms it creates
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            transport=httpx.AsyncHTTPTransport(retries=max_retries),
+            timeout=timeout,
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """Close the connections of the client."""
+        await self.client.aclose()
+
+    async def _fetch_forms(self) -> Union[list, None]:
+        """Fetch the list of forms the user has access to with its token, page by page
+        (see `Manager._fetch_forms`)."""
+        url = f"{self.url}/api/v{self.api_version}/assets.json"
+        params = {"q": "asset_type:survey", "limit": self.forms_page_size}
+
+        results = []
+        first_page = True
+        while url:
+            res = await self._get(url, params)
+
+            # If error while fetching the data, return None (unlike no forms)
+            if res.status_code != 200:
+                if first_page:
+                    return None
+                res.raise_for_status()
+
+            content = res.json()
+            results += content["results"]
+
+            first_page = False
+            url = content.get("next")
+            params = None
+
+        # Filter out the forms whose upload failed (see `Manager._fetch_forms`)
+        results = [r for r in results if r["asset_type"] != "empty"]
+
+        return results
+
+    async def _fetch_form(self, uid: str) -> Union[dict, None]:
+        """Fetch the asset of a single form (`None` if it can't be fetched)."""
+        url = f"{self.url}/api/v{self.api_version}/assets/{uid}.json"
+        res = await self._get(url)
+
+        if res.status_code != 200:
+            return None
+
+        return res.json()
+
+    async def _get_assets(self) -> dict:
+        """Return the assets of the forms by uid (see `Manager._get_assets`)."""
+        expired = (
+            self.forms_ttl is not None
+            and self._assets_fetched_at is not None
+            and time.monotonic() - self._assets_fetched_at > self.forms_ttl
+        )
+        if self._assets is None or expired:
+            forms = await self._fetch_forms()
+            # An error isn't cached, the list is fetched again by the next call
+            if forms is None:
+                return {} if self._assets is None else self._assets
+
+            self._assets = {form["uid"]: form for form in forms}
+            self._assets_fetched_at = time.monotonic()
+
+        return self._assets
+
+    def invalidate_forms(self) -> None:
+        """Forget the list of forms so it's fetched again by the next call to
+        `get_forms` or `get_form`."""
+        self._assets = None
+        self._assets_fetched_at = None
+
+    async def _get(self, url: str, params: dict = None):
+        return await _get(
+            self.client,
+            url,
+            self.headers,
+            params,
+            self.max_retries,
+            self.backoff_factor,
+        )
+
+    def _create_koboform(self, form: dict) -> AsyncKoboForm:
+        kform = AsyncKoboForm(uid=form["uid"], client=self.client)
+        kform._extract_from_asset(form)
+        kform.headers = self.headers
+        kform.max_retries = self.max_retries
+        kform.backoff_factor = self.backoff_factor
+
+        # The asset of a single form comes with its content
+        if "content" in form:
+            kform._load_asset(form)
+
+        return kform
+
+    async def get_forms(self) -> list:
+        assets = await self._get_assets()
+
+        return [self._create_koboform(form) for form in assets.values()]
+
+    async def get_form(self, uid: str) -> Union[AsyncKoboForm, None]:
+        assets = await self._get_assets()
+
+        form = assets.get(uid)
+
+        # The form may have been created after the list was fetched
+        if form is None:
+            form = await self._fetch_form(uid)
+
+            if form is None:
+                # If no forms
+                if not assets:
+                    return None
+                raise ValueError(f"There is no form with the uid: {uid}.")
+
+            kform = self._create_koboform(form)
+            assets[uid] = {k: v for k, v in form.items() if k != "content"}
+
+            return kform
+
+        return self._create_koboform(form)
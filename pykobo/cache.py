@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Union
+
+import requests
+
+
+class ResponseCache:
+    """
+    Cache on disk of the responses of the Kobo API, revalidated with conditional requests.
+
+    Each response is stored in the folder `directory` as 2 files: its body (`<key>.body`)
+    and its validators `ETag` and `Last-Modified` (`<key>.meta`). When the total size of
+    the files goes over `max_size` bytes, the least recently used responses are deleted.
+    """
+
+    def __init__(self, directory: str, max_size: int = 500 * 1024 * 1024) -> None:
+        self.directory = directory
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        # Running total of the size of the files, known after the first write (see `_scan`)
+        self._size = None
+        os.makedirs(directory, exist_ok=True)
+
+    def __repr__(self):
+        return f"ResponseCache('{self.directory}')"
+
+    @staticmethod
+    def key(uid: str, version_id: str, url: str, params: dict = None) -> str:
+        """Build the key of a response from the uid and the version of the form,
+        the url and the parameters of the request."""
+        params = sorted((params or {}).items())
+        raw = json.dumps([uid, version_id, url, params], default=str)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, key: str) -> Union[dict, None]:
+        """Return the cached response as a dict with the keys `etag`, `last_modified` and `body`,
+        or `None` if there is no response for `key`."""
+        path_meta, path_body = self._paths(key)
+        try:
+            with open(path_meta) as f:
+                entry = json.load(f)
+            with open(path_body, "rb") as f:
+                entry["body"] = f.read()
+        except (FileNotFoundError, ValueError):
+            return None
+
+        # Mark the response as recently used
+        for path in (path_meta, path_body):
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                return None
+
+        return entry
+
+    def set(self, key: str, etag: str, last_modified: str, body: bytes) -> None:
+        """Store a response. The files are written under a temporary name first so a response
+        is never read half written."""
+        path_meta, path_body = self._paths(key)
+        meta = {"etag": etag, "last_modified": last_modified}
+
+        tmp_suffix = f".{threading.get_ident()}.tmp"
+        with open(path_body + tmp_suffix, "wb") as f:
+            f.write(body)
+        with open(path_meta + tmp_suffix, "w") as f:
+            json.dump(meta, f)
+
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for size, _ in self._scan().values())
+
+            # The files of a previous response for the same key are replaced
+            for path in (path_body, path_meta):
+                self._size -= _file_size(path)
+                os.replace(path + tmp_suffix, path)
+                self._size += _file_size(path)
+
+            # The directory is only scanned when the cache is full
+            if self._size > self.max_size:
+                self._evict()
+
+    def clear(self) -> None:
+        """Delete all the cached responses."""
+        with self._lock:
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith((".body", ".meta")):
+                    os.remove(entry.path)
+            self._size = 0
+
+    def _paths(self, key: str) -> tuple:
+        path = os.path.join(self.directory, key)
+        return f"{path}.meta", f"{path}.body"
+
+    def _scan(self) -> dict:
+        """Return the size and the time of last use of the cached responses by key."""
+        responses = {}
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith((".body", ".meta")):
+                continue
+            key = entry.name[:-5]
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            size, last_used = responses.get(key, (0, 0))
+            responses[key] = (size + stat.st_size, max(last_used, stat.st_mtime))
+        return responses
+
+    def _evict(self) -> None:
+        """Delete the least recently used responses until the size of the cache is below
+        `max_size`. Must be called with the lock held."""
+        responses = self._scan()
+
+        # The total is computed again as other processes may share the directory
+        total_size = sum(size for size, _ in responses.values())
+        for key, (size, _) in sorted(responses.items(), key=lambda r: r[1][1]):
+            if total_size <= self.max_size:
+                break
+            for path in self._paths(key):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total_size -= size
+
+        self._size = total_size
+
+
+def _file_size(path: str) -> int:
+    """Size of the file at `path` (0 if it doesn't exist)."""
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+
+
+def cached_get(
+    session: requests.Session,
+    cache: Union[ResponseCache, None],
+    key: str,
+    url: str,
+    headers: dict = None,
+    params: dict = None,
+) -> requests.Response:
+    """Send a GET request with `session`. If `cache` isn't `None`, the request is sent with
+    the headers `If-None-Match` and `If-Modified-Since` of the cached response (if any).
+    If the server answers that the response hasn't changed (304), return the cached response."""
+
+    if cache is None:
+        return session.get(url=url, headers=headers, params=params)
+
+    entry = cache.get(key)
+    headers = dict(headers or {})
+    if entry is not None:
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    res = session.get(url=url, headers=headers, params=params)
+
+    if res.status_code == 304 and entry is not None:
+        cached = requests.Response()
+        cached.status_code = 200
+        cached.url = url
+        cached.headers["Content-Type"] = "application/json"
+        cached._content = entry["body"]
+        return cached
+
+    if res.status_code == 200:
+        etag = res.headers.get("ETag")
+        last_modified = res.headers.get("Last-Modified")
+        # Without validators the response can't be revalidated so there is no point keeping it
+        if etag or last_modified:
+            cache.set(key, etag, last_modified, res.content)
+
+    return res
@@ -0,0 +1,86 @@
+import json
+import os
+import uuid
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+except ImportError:  # pragma: no cover
+    pa = None
+
+# Formats of the files and their extension. 'arrow' is the Arrow IPC format
+FORMATS = {"parquet": "parquet", "arrow": "ipc"}
+
+# Column added to the tables to partition them by date of submission. Its name doesn't
+# start with '_' as the readers of datasets ignore the folders starting with '_'
+PARTITION_COLUMN = "submission_date"
+
+# File storing the `_id` of the last submission written in a folder
+STATE_FILE = "_pykobo_export.json"
+
+
+def to_arrow_table(df: pd.DataFrame) -> "pa.Table":
+    """Convert `df` to an Arrow table whose types don't depend on the values of `df`, so that
+    the tables of successive exports have the same schema. The lists and the dicts (e.g. the
+    column '_attachments') are serialized to JSON strings, the columns without any value are
+    strings and the categoricals are dictionaries of strings with int32 indices."""
+    df = df.copy()
+    for column in df.columns:
+        if df[column].dtype != object:
+            continue
+        df[column] = [
+            json.dumps(v) if isinstance(v, (list, dict)) else v for v in df[column]
+        ]
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    fields = []
+    for field in table.schema:
+        if pa.types.is_null(field.type):
+            field = field.with_type(pa.string())
+        elif pa.types.is_dictionary(field.type):
+            field = field.with_type(pa.dictionary(pa.int32(), pa.string()))
+        fields.append(field)
+
+    return table.cast(pa.schema(fields))
+
+
+def write_table(
+    table: "pa.Table", directory: str, format: str, partition_by_date: bool
+) -> None:
+    """Write `table` to new files in `directory`. The files already in `directory` are never
+    modified. If `partition_by_date` is True, the rows are written in one sub folder per
+    value of the column `PARTITION_COLUMN` (e.g. 'submission_date=2022-09-01')."""
+    partitioning = None
+    if partition_by_date:
+        partitioning = ds.partitioning(
+            pa.schema([table.schema.field(PARTITION_COLUMN)]), flavor="hive"
+        )
+
+    ds.write_dataset(
+        table,
+        directory,
+        format=FORMATS[format],
+        partitioning=partitioning,
+        basename_template=f"part-{uuid.uuid4().hex}-{{i}}.{format}",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+
+
+def read_last_id(directory: str):
+    """Return the `_id` of the last submission exported to `directory` (`None` if nothing
+    has been exported yet)."""
+    try:
+        with open(os.path.join(directory, STATE_FILE)) as f:
+            return json.load(f)["last_id"]
+    except FileNotFoundError:
+        return None
+
+
+def write_last_id(directory: str, last_id: int) -> None:
+    path = os.path.join(directory, STATE_FILE)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump({"last_id": last_id}, f)
+    os.replace(f"{path}.tmp", path)
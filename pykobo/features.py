@@ -1,8 +1,25 @@
 class Question:
+    # A form can have thousands of questions (and a process thousands of forms)
+    # so the attributes are stored in slots instead of a dict per question
+    __slots__ = (
+        "name",
+        "type",
+        "label",
+        "xpath",
+        "group_name",
+        "group_label",
+        "repeat_name",
+        "repeat_label",
+        "select_from_list_name",
+        "choices",
+    )
+
     def __init__(self, name: str, type: str, label: str = None) -> None:
         self.name = name
         self.type = type
         self.label = label
+        # Path of the question in the submissions, with its groups (e.g. 'group/question')
+        self.xpath = name
         self.group_name = None
         self.group_label = None
         self.repeat_name = None
@@ -10,5 +27,16 @@ class Question:
         self.select_from_list_name = None
         self.choices = None
 
+    def to_dict(self) -> dict:
+        """Return the attributes of the question, except its choices."""
+        return {a: getattr(self, a) for a in self.__slots__ if a != "choices"}
+
+    @classmethod
+    def from_dict(cls, attributes: dict) -> "Question":
+        q = cls(attributes["name"], attributes["type"], attributes["label"])
+        for a, value in attributes.items():
+            setattr(q, a, value)
+        return q
+
     def __repr__(self):
         return f"Question('{self.name}, {self.type}, {self.label}')"
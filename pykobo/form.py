@@ -1,16 +1,81 @@
+import json
+import logging
+import os
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import Union
 
 import numpy as np
 import pandas as pd
 import requests
 
+from .cache import ResponseCache, cached_get
+from .export import (
+    FORMATS,
+    PARTITION_COLUMN,
+    pa,
+    read_last_id,
+    to_arrow_table,
+    write_last_id,
+    write_table,
+)
 from .features import Question
+from .geo import COORDINATES, GEO_TYPES, parse_geopoints, to_geometry
+from .schema import SCHEMAS
+from .session import create_session
+
+try:
+    import ijson
+except ImportError:  # pragma: no cover
+    ijson = None
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# Number of submissions per page when the pages are fetched in parallel
+# and no `page_size` is given
+DEFAULT_PAGE_SIZE = 1000
+
+# dtypes of the columns, by type of question, when the types are coerced
+DTYPES = {
+    "integer": "Int64",
+    "decimal": "float64",
+    "range": "float64",
+    "geo": "float64",
+    "date": "datetime64[ns, UTC]",
+    "dateTime": "datetime64[ns, UTC]",
+    "start": "datetime64[ns, UTC]",
+    "end": "datetime64[ns, UTC]",
+    "today": "datetime64[ns, UTC]",
+}
+
+# Types of the questions whose answers are files attached to the submissions
+MEDIA_TYPES = ["image", "audio", "video", "file", "background-audio"]
+
+# Fields of the submissions always fetched when only some of the columns are fetched
+# (needed to merge new submissions and to export the data)
+REQUIRED_FIELDS = ["_id", "_submission_time"]
+
+
+def _intern(value):
+    """Intern the strings so the names and the labels repeated in the questions
+    and the choices of the forms are stored once."""
+    return sys.intern(value) if isinstance(value, str) else value
 
 
 class KoboForm:
-    def __init__(self, uid: str) -> None:
+    def __init__(
+        self, uid: str, session: requests.Session = None, cache: ResponseCache = None
+    ) -> None:
         self.uid = uid
         self.headers = None
+        # When the form is created by a `Manager`, it shares the session of the manager
+        self.session = session if session is not None else create_session()
+        # Cache on disk of the responses for the asset and the data (optional)
+        self.cache = cache
         self.metadata = {}
         self.data = None
         self.has_geo = False
@@ -26,14 +91,369 @@ class KoboForm:
         self.naming_conflicts = None
         self.separator = "|"
         self.__initial_separator = " "
+        # Return the columns of type 'select_one' as categoricals
+        self.categorical = False
+        # Add a column of 0/1 per choice after the columns of type 'select_multiple'
+        self.one_hot = False
+        # Convert the columns to the dtypes in `DTYPES` based on the type of the questions
+        self.coerce_types = False
+        # 'pyarrow' to store the columns of strings as 'string[pyarrow]' instead of objects
+        self.dtype_backend = "numpy"
+        # Questions, groups and fields of the submissions fetched (`None` for all of them)
+        self.fields = None
+        self.__projection = None
+        # Filter of the submissions fetched (`None` for all of them)
+        self.query = None
 
     def __repr__(self):
         return f"KoboForm('{self.uid}')"
 
-    def fetch_data(self) -> Union[pd.DataFrame, dict]:
+    def fetch_data(
+        self,
+        page_size: int = None,
+        max_workers: int = None,
+        categorical: bool = False,
+        one_hot: bool = False,
+        coerce_types: bool = False,
+        stream: bool = False,
+        dtype_backend: str = "numpy",
+        fields: list = None,
+        query: dict = None,
+    ) -> Union[pd.DataFrame, dict]:
         """Fetch the form's data and store them as a Pandas DF in the attribute `data`.
-        If the form has repeat groups, extract them as separate DFs"""
+        If the form has repeat groups, extract them as separate DFs.
+
+        The submissions are fetched page by page, following the `next` link
+        returned by the API until all of them have been downloaded. If `page_size`
+        is given, the pages are requested explicitly with the `start` and `limit`
+        parameters. Each page is converted to a DF as soon as it is received
+        so the raw JSON of the whole form is never held in memory at once.
+
+        If `max_workers` is greater than 1, the pages are fetched in parallel
+        by a pool of `max_workers` threads and put back together in order.
+
+        If `categorical` is True, the columns of type 'select_one' are categoricals whose
+        categories are the choices of the question (`display` then only renames the categories).
+        If `one_hot` is True, each column of type 'select_multiple' is followed by a column
+        of 0/1 (uint8) per choice, named '<question>/<choice>'.
+        If `coerce_types` is True, the columns are converted based on the type of their question:
+        integers to Int64, decimals and coordinates to float64, dates and times to datetime64 (UTC).
+
+        If `dtype_backend` is 'pyarrow' (requires the package `pyarrow`), the columns of strings
+        are stored in Arrow arrays ('string[pyarrow]'), built from the values of each page without
+        going through columns of Python objects, the columns of type 'select_one' are
+        categoricals (as with `categorical=True`) and the dates and times are converted to
+        datetime64 (UTC) even if `coerce_types` is False.
+
+        If `stream` is True (requires the package `ijson`), the submissions are parsed one by one
+        while the response is downloaded, instead of parsing the whole page at once. The pages are
+        then fetched one at a time, without using the cache.
+
+        If `fields` is given, only these columns are fetched (see `_project`): a list of names or
+        labels of questions, names or labels of groups (all their questions) and fields of the
+        submissions (e.g. '_uuid'). The selection is sent to the API (parameter `fields`) so the
+        other answers aren't downloaded. `_id` and `_submission_time` are always fetched.
+
+        If `query` is given, only the submissions matching it are fetched. It's a filter in the
+        syntax of MongoDB whose fields are names or labels of questions and fields of the submissions
+        (see `_filter`), sent to the API (parameter `query`) so the submissions are filtered
+        by the server."""
+
+        self._set_options(categorical, one_hot, coerce_types, dtype_backend, stream)
+
+        self._prepare_schema()
+        params = self._data_params(fields, query)
+
+        pages = []
+        repeats = {}
+        nb_rows = 0
+        fetched = False
+        if max_workers is not None and max_workers > 1 and not stream:
+            iter_pages = self._iter_pages_parallel(page_size, max_workers, params)
+        else:
+            iter_pages = self._iter_pages(page_size, params=params, stream=stream)
+
+        for page in iter_pages:
+            fetched = True
+            df_page = self._process_page(page, nb_rows, repeats)
+            nb_rows += len(df_page)
+            pages.append(df_page)
+
+        # If error while fetching the data, return an empty DF
+        if not fetched:
+            return pd.DataFrame()
+
+        self._set_data(*self._build_frames(pages, repeats))
+
+    def iter_batches(
+        self,
+        batch_size: int = DEFAULT_PAGE_SIZE,
+        categorical: bool = False,
+        one_hot: bool = False,
+        coerce_types: bool = False,
+        stream: bool = False,
+        dtype_backend: str = "numpy",
+        fields: list = None,
+        query: dict = None,
+    ):
+        """Fetch the form's data by batches of `batch_size` submissions and yield each batch as
+        a tuple (DF of the data, dict of the DFs of the repeat groups with the children of these
+        submissions). The batches aren't stored in `data`, so the data of the whole form are never
+        held in memory at once (e.g. to write them to a database or to files as they are fetched).
+
+        Each batch is a page of submissions (the last one, or all of them if the server returns
+        smaller pages, can have less than `batch_size` submissions), built as by `fetch_data` with
+        the same parameters. The '_index' and '_parent_index' are numbered across the batches,
+        as in the DFs built by `fetch_data`. The columns and the choices use names or labels
+        as set with `display`."""
+
+        self._set_options(categorical, one_hot, coerce_types, dtype_backend, stream)
+        self._check_page_size(batch_size)
+
+        self._prepare_schema()
+        params = self._data_params(fields, query)
+
+        # Number of rows of each DF in the previous batches
+        offsets = {}
+        for page in self._iter_pages(batch_size, params=params, stream=stream):
+            repeats = {}
+            df_page = self._process_page(page, 0, repeats)
+            if len(df_page) == 0:
+                continue
+
+            data, repeats = self._build_frames([df_page], repeats)
+            self._shift_indices(data, repeats, offsets)
+
+            yield data, repeats
+
+    def _set_options(
+        self,
+        categorical: bool,
+        one_hot: bool,
+        coerce_types: bool,
+        dtype_backend: str,
+        stream: bool = False,
+    ) -> None:
+        """Set how the DFs are built from the submissions (see `fetch_data`)."""
+        if stream and ijson is None:
+            raise ImportError(
+                "Fetching the data with 'stream=True' requires the package 'ijson'."
+            )
+
+        self._check_dtype_backend(dtype_backend)
+
+        self.dtype_backend = dtype_backend
+        self.categorical = categorical or dtype_backend == "pyarrow"
+        self.one_hot = one_hot
+        self.coerce_types = coerce_types
+
+    def _data_params(self, fields: list, query: dict) -> Union[dict, None]:
+        """Return the parameters of the requests of the data selecting the columns `fields`
+        and the submissions matching `query` (`None` if there is no selection)."""
+        params = self._project(fields)
+        query = self._filter(query)
+        if query is not None:
+            params = dict(params or {}, query=json.dumps(query))
+
+        return params
+
+    def _shift_indices(self, data: pd.DataFrame, repeats: dict, offsets: dict) -> None:
+        """Shift the '_index' and '_parent_index' of the DFs of a batch, numbered from 1 in the batch,
+        by the number of rows of the previous batches in `offsets` (by repeat group, `None` for the data),
+        which is then updated with the rows of the batch."""
+        shifts = {None: offsets.get(None, 0)}
+        shifts.update({k: offsets.get(k, 0) for k in repeats})
+
+        data["_index"] += shifts[None]
+        offsets[None] = shifts[None] + len(data)
+
+        for k, v in repeats.items():
+            parent = self.__repeats_structure[k]["parent"]
+            v["_index"] += shifts[k]
+            v["_parent_index"] += shifts.get(parent, offsets.get(parent, 0))
+            offsets[k] = shifts[k] + len(v)
+
+    def fetch_new_data(
+        self, since=None, watermark: str = "_submission_time", page_size: int = None
+    ):
+        """Fetch only the submissions whose value for the column `watermark` (`_submission_time`
+        or `_id`) is greater than `since` and merge them into `data` (and the DFs of the repeat groups).
+        The submissions already in `data` (same `_id`) are replaced by their new version.
+        Return the new watermark, i.e. the greatest value of the column `watermark` fetched,
+        to be used as `since` for the next call (or `since` if there is no new submission).
+
+        If `since` is `None` or the data haven't been fetched yet, all the submissions (newer than
+        `since` if given) are fetched. Only the columns selected and the submissions matching the filter
+        given with the parameters `fields` and `query` of `fetch_data` are fetched."""
+
+        params = self._new_data_params(since, watermark)
+
+        pages = []
+        repeats = {}
+        nb_rows = 0
+        for page in self._iter_pages(page_size, params=params):
+            df_page = self._process_page(page, nb_rows, repeats)
+            nb_rows += len(df_page)
+            pages.append(df_page)
+
+        return self._add_new_data(pages, repeats, since, watermark)
+
+    def _new_data_params(self, since, watermark: str) -> Union[dict, None]:
+        """Return the parameters of the requests of the submissions newer than `since`
+        (see `fetch_new_data`)."""
+        if watermark not in ["_submission_time", "_id"]:
+            raise ValueError(
+                f"'{watermark}' is not an accepted value for the parameter 'watermark'. Accepted values are '_submission_time' or '_id'."
+            )
+
+        self._prepare_schema()
+
+        params = self._project(self.fields)
+        query = self._filter(self.query)
+        if since is not None:
+            condition = {watermark: {"$gt": since}}
+            query = condition if query is None else {"$and": [query, condition]}
+        if query is not None:
+            params = dict(params or {}, query=json.dumps(query))
+
+        return params
+
+    def _add_new_data(self, pages: list, repeats: dict, since, watermark: str):
+        """Build the DFs of the new submissions from the DFs of their pages, merge them into
+        `data` and return the new watermark (see `fetch_new_data`)."""
+        if sum(len(df_page) for df_page in pages) == 0:
+            return since
+
+        new_data, new_repeats = self._build_frames(pages, repeats)
+        new_watermark = new_data[watermark].max()
+
+        if self.data is None or self.data.empty:
+            self._set_data(new_data, new_repeats)
+        else:
+            self._merge_frames(new_data, new_repeats)
+
+        # Return a Python object (not a numpy scalar) so it can be serialized
+        if isinstance(new_watermark, np.generic):
+            new_watermark = new_watermark.item()
+
+        return new_watermark
+
+    def _set_data(self, data: pd.DataFrame, repeats: dict) -> None:
+        self.data = data
+        self.repeats = repeats
+        self.__initial_separator = self.separator
+
+    def _merge_frames(self, new_data: pd.DataFrame, new_repeats: dict) -> None:
+        """Merge the DFs `new_data` and `new_repeats` built from new submissions into `data`
+        and `repeats`. The submissions already in `data` keep their `_index`, the others
+        get the next ones."""
+
+        existing = pd.Series(self.data["_index"].values, index=self.data["_id"].values)
+        is_edited = new_data["_id"].isin(existing.index)
+
+        # `_index` of the new rows once merged
+        new_index = pd.Series(np.nan, index=new_data.index)
+        new_index[is_edited] = new_data.loc[is_edited, "_id"].map(existing).values
+        new_index[~is_edited] = np.arange(
+            self.data["_index"].max() + 1,
+            self.data["_index"].max() + 1 + (~is_edited).sum(),
+        )
+        new_index = new_index.astype(int)
+        mapping = pd.Series(new_index.values, index=new_data["_index"].values)
+
+        replaced = new_index[is_edited].values
+        new_data["_index"] = new_index.values
+
+        self.data = pd.concat(
+            [self.data[~self.data["_index"].isin(replaced)], new_data],
+            ignore_index=True,
+        )
+        self.data.sort_values("_index", kind="mergesort", inplace=True)
+        self.data.reset_index(drop=True, inplace=True)
+
+        # The repeat groups are merged level by level, from the root: the children of the
+        # replaced rows of a level are replaced too and the '_parent_index' of the new
+        # children are mapped to the '_index' of their parent once merged
+        mappings = {None: mapping}
+        removed = {None: replaced}
+        for k, structure in self.__repeats_structure.items():
+            if k not in self.repeats and k not in new_repeats:
+                continue
+
+            parent = structure["parent"]
+            current = self.repeats.get(k)
+            if current is not None:
+                is_removed = current["_parent_index"].isin(removed.get(parent, []))
+                removed[k] = current.loc[is_removed, "_index"].values
+                current = current[~is_removed]
+                next_index = current["_index"].max() + 1 if len(current) else 1
+            else:
+                removed[k] = []
+                next_index = 1
+
+            v = new_repeats.get(k)
+            if v is not None:
+                v["_parent_index"] = v["_parent_index"].map(mappings.get(parent)).values
+                new_child_index = np.arange(next_index, next_index + len(v))
+                mappings[k] = pd.Series(new_child_index, index=v["_index"].values)
+                v["_index"] = new_child_index
+                if current is not None:
+                    v = pd.concat([current, v], ignore_index=True)
+                    v.sort_values("_parent_index", kind="mergesort", inplace=True)
+            else:
+                mappings[k] = pd.Series(dtype=int)
+                v = current
+
+            self.repeats[k] = v.reset_index(drop=True)
+
+        # The categoricals with different categories are concatenated as objects
+        if self.categorical:
+            self._to_categorical(self.data, self.__root_structure, self.__columns_as)
+            for k, v in self.repeats.items():
+                self._to_categorical(
+                    v, self.__repeats_structure[k]["columns"], self.__columns_as
+                )
+
+    def _prepare_schema(self) -> None:
+        """Build the structure of the form from its content, fetching the asset if needed.
+        The structure is compiled once per version of the form and shared by all the forms
+        of the process (see `SCHEMAS`), and by the next processes if the form has a cache."""
+        if self._lookup_schema():
+            return
 
+        if not self.__asset:
+            self._fetch_asset()
+
+        self._compile_schema()
+
+    def _lookup_schema(self) -> bool:
+        """Use the structure of the version of the form compiled before, if any (see
+        `SCHEMAS`). Return `True` if the form has its structure, so the asset isn't needed."""
+
+        # The structure has already been built by a previous fetch
+        if self.__root_structure:
+            return True
+
+        version_id = self.metadata.get("version_id")
+        if version_id is None:
+            return False
+
+        schema = SCHEMAS.get(self.uid, version_id, self._schema_directory())
+        if schema is None:
+            return False
+
+        self._use_schema(schema)
+
+        # Everything needed is in the schema
+        self.__asset = None
+        self.__content = None
+
+        return True
+
+    def _compile_schema(self) -> None:
+        """Build the structure of the form from the asset (already fetched) and store it
+        in `SCHEMAS`."""
+        version_id = self.__asset.get("version_id", self.metadata.get("version_id"))
         self._get_survey()
 
         # It's possible for a form to have no "choices" (corresponds to
@@ -42,58 +462,98 @@ class KoboForm:
         if "choices" in self.__content:
             self._get_choices()
 
-        # Fetch the data
-        res = requests.get(url=self.url_data, headers=self.headers)
+        if version_id is not None:
+            SCHEMAS.set(self.uid, version_id, self._schema(), self._schema_directory())
 
-        # If error while fetching the data, return an empty DF
-        if res.status_code != 200:
-            return pd.DataFrame()
-
-        data = res.json()["results"]
-
-        self.data = pd.DataFrame(data)
-
-        self._remove_unused_columns()
-
-        # For columns containing the group(s) they belong to in their name, remove it to only
-        # keep the name of the column
-        __dict_rename = {}
-        for c in self.data.columns:
-            __dict_rename[c] = c.split("/")[-1]
+        # Everything needed has been extracted from the asset
+        self.__asset = None
+        self.__content = None
 
-        self.data.rename(columns=__dict_rename, inplace=True)
+    def _schema_directory(self) -> Union[str, None]:
+        """Directory where the schemas are saved (the one of the cache, if any)."""
+        return self.cache.directory if self.cache is not None else None
+
+    def _schema(self) -> dict:
+        """Return a copy of the structure of the form (see `SchemaCache`)."""
+        return self._copy_schema(
+            {
+                "root_structure": self.__root_structure,
+                "geo": self.geo,
+                "repeats_structure": self.__repeats_structure,
+                "has_geo": self.has_geo,
+                "has_repeats": self.has_repeats,
+                "naming_conflicts": self.naming_conflicts,
+            }
+        )
+
+    def _use_schema(self, schema: dict) -> None:
+        """Use a copy of the structure `schema` as the structure of the form."""
+        schema = self._copy_schema(schema)
+        self.__root_structure = schema["root_structure"]
+        self.geo = schema["geo"]
+        self.__repeats_structure = schema["repeats_structure"]
+        self.has_geo = schema["has_geo"]
+        self.has_repeats = schema["has_repeats"]
+        self.naming_conflicts = schema["naming_conflicts"]
+
+    @staticmethod
+    def _copy_schema(schema: dict) -> dict:
+        """Copy the lists of a structure, so the structure of a form can be modified
+        (e.g. when adding the columns of the geopoints) without modifying the cached one.
+        The `Question` objects are shared."""
+        copy = dict(schema)
+        copy["root_structure"] = list(schema["root_structure"])
+        copy["geo"] = list(schema["geo"])
+        copy["repeats_structure"] = {
+            k: dict(v, columns=list(v["columns"]), geo=list(v["geo"]))
+            for k, v in schema["repeats_structure"].items()
+        }
+        return copy
+
+    def _build_frames(self, pages: list, repeats: dict) -> tuple:
+        """Build the DF of the data (and the DFs of the repeat groups) from the DFs of the
+        pages of submissions and the children of the repeat groups collected in `repeats`.
+        The columns and the choices use names or labels as set with `display`."""
+        if len(pages) > 1:
+            data = pd.concat(pages, ignore_index=True)
+        else:
+            data = pages[0]
 
         # Add a column '_index' that can be used to join the parent DF
         # with the children DFs (which have the column '_parent_index')
-        self.data["_index"] = self.data.index + 1
+        data["_index"] = data.index + 1
 
         # If the form has at least one repeat group
         if self.has_repeats:
-            self._extract_repeats(data)
+            repeats = self._extract_repeats(repeats)
 
-            # In the parent DF delete the columns that contain the repeat groups
-            # In the API there is a column with the same name as the name of
-            # the repeat group + the suffix '_count' just before the repeat group.
-            # We can delete it
-            repeats_count = [f"{c}_count" for c in self.repeats.keys()]
-            to_delete = list(self.repeats.keys()) + repeats_count
+        # Only the repeat groups with columns fetched (or containing
+        # such repeat groups) are kept
+        if self.__projection is not None:
+            repeats = {
+                k: v for k, v in repeats.items() if k in self.__projection["columns"]
+            }
 
-            self.data.drop(columns=to_delete, inplace=True)
+        root_structure = self._projected(self.__root_structure)
 
         # The JSON object returned by the API containing the form data doesn't
         # have properties for empyty columns. So, here all empty columns are missing.
         # We need to add them
-        for q in self.__root_structure:
-            if q.name not in self.data.columns:
-                self.data[q.name] = np.nan
+        for q in root_structure:
+            if q.name not in data.columns:
+                data[q.name] = np.nan
         if self.has_repeats:
-            for k, v in self.repeats.items():
-                for q in self.__repeats_structure[k]["columns"]:
+            for k, v in repeats.items():
+                for q in self._projected(self.__repeats_structure[k]["columns"], k):
                     if q.name not in v.columns:
                         v[q.name] = np.nan
 
-        if self.has_geo:
-            self._split_gps_coords()
+        self._split_gps_coords(data, repeats)
+
+        self._coerce_types(data, self._options_plan(self.__root_structure))
+        for k, v in repeats.items():
+            plan = self._options_plan(self.__repeats_structure[k]["columns"])
+            self._coerce_types(v, plan)
 
         # At this point we don't add or delete columns any more
         # so we can reorder the columns as they are in the API
@@ -102,35 +562,163 @@ class KoboForm:
         # will be moved to the end
         last_columns = [
             c
-            for c in self.data.columns
-            if c not in [q.name for q in self.__root_structure]
+            for c in data.columns
+            if c not in [q.name for q in root_structure] and self._is_fetched(c, None)
         ]
 
-        columns_ordered = [q.name for q in self.__root_structure] + last_columns
+        columns_ordered = [q.name for q in root_structure] + last_columns
 
-        self.data = self.data[columns_ordered]
+        data = data[columns_ordered]
 
         if self.has_repeats:
-            for k, v in self.repeats.items():
+            for k, v in repeats.items():
                 columns_ordered = [
-                    q.name for q in self.__repeats_structure[k]["columns"]
+                    q.name
+                    for q in self._projected(self.__repeats_structure[k]["columns"], k)
+                ]
+                # Columns of a repeat group that isn't in the form anymore
+                columns_ordered += [
+                    c
+                    for c in v.columns
+                    if c not in columns_ordered
+                    and c not in ["_index", "_parent_index"]
+                    and self._is_fetched(c, k)
                 ]
 
-                # The column'_parent_index' will be in the last position
-                columns_ordered.append("_parent_index")
+                # The columns '_index' and '_parent_index' will be in the last positions
+                columns_ordered += ["_index", "_parent_index"]
 
-                self.repeats[k] = self.repeats[k][columns_ordered]
+                # With `fields`, a subset of the columns: a new DF rather than a slice of it
+                repeats[k] = repeats[k].reindex(columns=columns_ordered)
 
         # We need to run `_change_choices` here in order to format the multiple choices
         # so that it's possible to go back and forth between name and label for the choices
         # In the Kobo API, multiple choices are seprated by ' '. We replace ' ' with self.separator
-        self._change_choices(self.data, self.__root_structure, self.__choices_as)
+        self._change_choices(
+            data, self.__root_structure, self.__choices_as, "name", " "
+        )
         if self.has_repeats:
-            for k, v in self.repeats.items():
+            for k, v in repeats.items():
                 self._change_choices(
-                    v, self.__repeats_structure[k]["columns"], self.__choices_as
+                    v,
+                    self.__repeats_structure[k]["columns"],
+                    self.__choices_as,
+                    "name",
+                    " ",
                 )
-        self.__initial_separator = self.separator
+
+        if self.categorical:
+            self._to_categorical(data, self.__root_structure, "name")
+            for k, v in repeats.items():
+                self._to_categorical(v, self.__repeats_structure[k]["columns"], "name")
+
+        if self.one_hot:
+            data = self._add_one_hot(data, self.__root_structure)
+            for k, v in repeats.items():
+                repeats[k] = self._add_one_hot(
+                    v, self.__repeats_structure[k]["columns"]
+                )
+
+        # Use the same names for the columns as in the data already displayed
+        if self.__columns_as != "name":
+            self._rename_frame_columns(
+                data, self.__root_structure, "name", self.__columns_as
+            )
+            for k, v in repeats.items():
+                self._rename_frame_columns(
+                    v, self.__repeats_structure[k]["columns"], "name", self.__columns_as
+                )
+
+        # The columns added or rebuilt since the pages were processed
+        if self.dtype_backend == "pyarrow":
+            self._to_arrow_strings(data)
+            for v in repeats.values():
+                self._to_arrow_strings(v)
+
+        return data, repeats
+
+    def _dtype_plan(self, structure: list, columns_as: str = "name") -> dict:
+        """Return the dtype of each column of `structure` which needs to be converted."""
+        return {
+            getattr(q, columns_as): DTYPES[q.type]
+            for q in structure
+            if q.type in DTYPES
+        }
+
+    def _options_plan(self, structure: list) -> dict:
+        """Return the dtypes the columns of `structure` are converted to when the data
+        are fetched: all the dtypes with `coerce_types`, only the dates and times with the
+        backend 'pyarrow' (an Arrow string isn't cheaper than a datetime64 and it can't be
+        compared or filtered as a date), none otherwise."""
+        plan = self._dtype_plan(structure)
+        if self.coerce_types:
+            return plan
+        if self.dtype_backend == "pyarrow":
+            return {c: t for c, t in plan.items() if t.startswith("datetime64")}
+        return {}
+
+    def _coerce_types(self, df: pd.DataFrame, plan: dict) -> None:
+        """Convert the columns of `df` to the dtypes of `plan`. The values which can't be
+        converted become missing values."""
+        for column, dtype in plan.items():
+            if column not in df.columns:
+                continue
+
+            if dtype.startswith("datetime64"):
+                df[column] = pd.to_datetime(df[column], errors="coerce", utc=True)
+            else:
+                values = pd.to_numeric(df[column], errors="coerce")
+                # The values which aren't integers (e.g. answered before the type of
+                # the question was changed) become missing values
+                if dtype == "Int64":
+                    values = values.where(values.isna() | (values % 1 == 0))
+                df[column] = values.astype(dtype)
+
+    def _to_categorical(
+        self, df: pd.DataFrame, structure: list, columns_as: str
+    ) -> None:
+        """Convert the columns of type 'select_one' to categoricals whose categories are
+        the choices of the question. The values which are not among the choices (e.g. choices
+        removed from the form) are kept as extra categories."""
+        for q in structure:
+            if q.type != "select_one" or not q.choices:
+                continue
+
+            column = getattr(q, columns_as)
+            if column not in df.columns:
+                continue
+
+            categories = list(dict.fromkeys(c[self.__choices_as] for c in q.choices))
+            values = df[column].astype(object)
+            extra = set(values.dropna().unique()) - set(categories)
+            df[column] = pd.Categorical(values, categories=categories + sorted(extra))
+
+    def _add_one_hot(self, df: pd.DataFrame, structure: list) -> pd.DataFrame:
+        """Add after each column of type 'select_multiple' a column of 0/1 per choice
+        named '<question>/<choice>'. The columns of `df` are expected to be named with the
+        names of the questions."""
+        blocks = {}
+        for q in structure:
+            if q.type != "select_multiple" or not q.choices or q.name not in df.columns:
+                continue
+
+            dummies = df[q.name].fillna("").astype(str).str.get_dummies(self.separator)
+            dummies = dummies.reindex(
+                columns=[c[self.__choices_as] for c in q.choices], fill_value=0
+            ).astype("uint8")
+            dummies.columns = [f"{q.name}/{c['name']}" for c in q.choices]
+            blocks[q.name] = dummies
+
+        if not blocks:
+            return df
+
+        columns_ordered = []
+        for c in df.columns:
+            columns_ordered.append(c)
+            if c in blocks:
+                columns_ordered += list(blocks[c].columns)
+
+        return pd.concat([df] + list(blocks.values()), axis=1)[columns_ordered]
 
     def display(self, columns_as: str = "name", choices_as: str = "name") -> None:
         """Update the DatFrames containing the data by using names or labels for
@@ -166,68 +754,328 @@ class KoboForm:
         # Create media url
         media_url = f"{self.base_url}/{self.uid}/files/?format=json"
         # Request media and extract dataframe
-        res = requests.get(url=media_url, headers=self.headers)
-        media = res.json()["results"]
+        res = self.session.get(url=media_url, headers=self.headers)
+        self.media = self._build_media(res.json()["results"])
+
+    def _build_media(self, results: list) -> pd.DataFrame:
+        media = pd.DataFrame(results)
         if not media.empty:
             media[["hash", "filename", "mimetype"]] = pd.json_normalize(media.metadata)
-        self.media = pd.DataFrame(media)
+        return media
 
     def fetch_attachments(self, media_columns: list):
         """
         This function returns attached media in new columns,
         one for each question with media, given df."""
 
+        lookup = self._attachments_lookup()
+
+        # The names of the files of all the columns, one row per (submission, column)
+        values = self.data[["_index"] + list(media_columns)].melt(
+            id_vars="_index", var_name="column", value_name="filename_ok"
+        )
+        # Replace the ' ' (spaces) by '_' as in the names of the attached files
+        names = values["filename_ok"].astype(object)
+        values["filename_ok"] = names.where(
+            names.isna(), names.astype(str).str.replace(" ", "_")
+        )
+
+        urls = values.merge(lookup, how="left", on=["_index", "filename_ok"]).pivot(
+            index="_index", columns="column", values="download_url"
+        )
+
         for column in media_columns:
-            self.data["media_" + column] = self.data.apply(
-                lambda x: self._obtain_url(x, column), axis=1
+            self.data["media_" + column] = (
+                urls[column].reindex(self.data["_index"]).values
+            )
+
+    def _attachments_lookup(self) -> pd.DataFrame:
+        """Return a DF with the url ('download_url') of each file attached to the submissions,
+        identified by the '_index' of the submission and the name of the file ('filename_ok').
+        In the names of the files, the ' ' (spaces) are replaced by '_'."""
+
+        lookup = self._explode_attachments(self.data)
+        lookup["filename_ok"] = lookup.pop("filename").str.replace(" ", "_")
+
+        # If several files have the same name, the first one is used
+        return lookup[["_index", "filename_ok", "download_url"]].drop_duplicates(
+            ["_index", "filename_ok"]
+        )
+
+    def _explode_attachments(self, data: pd.DataFrame) -> pd.DataFrame:
+        """Return a DF with one row per file attached to the submissions of `data`:
+        the '_index' and '_id' of the submission, the name of the file ('filename',
+        without the folders) and its url ('download_url')."""
+
+        columns = [c for c in ["_index", "_id"] if c in data.columns]
+        attachments = data[columns + ["_attachments"]].explode("_attachments")
+        attachments = attachments[attachments["_attachments"].notna()]
+
+        details = pd.json_normalize(attachments["_attachments"].tolist())
+        if "filename" not in details.columns:
+            return pd.DataFrame(
+                {
+                    "_index": pd.Series(dtype="int64"),
+                    "_id": pd.Series(dtype="int64"),
+                    "filename": pd.Series(dtype=object),
+                    "download_url": pd.Series(dtype=object),
+                }
+            )
+
+        exploded = attachments[columns].reset_index(drop=True)
+        exploded["filename"] = details["filename"].str.split("/").str[-1].values
+        exploded["download_url"] = details["download_url"].values
+
+        return exploded
+
+    def download_attachments(
+        self,
+        directory: str,
+        rows: pd.Series = None,
+        max_workers: int = 4,
+        chunk_size: int = 1024 * 1024,
+    ) -> pd.DataFrame:
+        """Download the files attached to the submissions (photos, audios...) in the folder
+        `directory`, in a sub folder per submission named with its '_id'. `rows` is an optional
+        boolean Series to only download the files of some submissions of `data`.
+
+        The files are downloaded by a pool of `max_workers` threads and written to the disk
+        by chunks of `chunk_size` bytes. A file which is already in `directory` with the same size
+        as on the server isn't downloaded again, and a file whose download was interrupted is
+        resumed where it stopped (or downloaded again if the server can't resume it).
+
+        Return a DF with one row per file ('_index', '_id', 'filename', 'download_url', 'path',
+        'size' and 'status': 'downloaded', 'resumed', 'skipped' or 'failed') which can be joined
+        with `data` on the column '_index'."""
+
+        manifest = self._attachments_manifest(directory, rows)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(
+                executor.map(
+                    lambda task: self._download_attachment(*task, chunk_size),
+                    zip(manifest["download_url"], manifest["path"]),
+                )
             )
 
+        self._set_download_results(manifest, results)
+
+        return manifest
+
+    def _attachments_manifest(self, directory: str, rows: pd.Series) -> pd.DataFrame:
+        """Return the files attached to the submissions of `data` (all of them or the ones
+        selected by `rows`) with the path where they are downloaded in `directory`."""
+        data = self.data if rows is None else self.data[rows]
+        manifest = self._explode_attachments(data)
+
+        manifest["path"] = [
+            os.path.join(directory, str(_id), filename)
+            for _id, filename in zip(manifest["_id"], manifest["filename"])
+        ]
+
+        return manifest
+
+    def _set_download_results(self, manifest: pd.DataFrame, results: list) -> None:
+        manifest["size"] = pd.array([size for size, _ in results], dtype="Int64")
+        manifest["status"] = [status for _, status in results]
+
+    def _download_attachment(self, url: str, path: str, chunk_size: int) -> tuple:
+        """Download the file at `url` to `path`. The file is first written to '<path>.part'
+        which is renamed once the download is complete. Return the size of the file and
+        the status of the download."""
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            if os.path.exists(path):
+                res = self.session.head(url, headers=self.headers, allow_redirects=True)
+                res.raise_for_status()
+                size = res.headers.get("Content-Length")
+                if size is not None and int(size) == os.path.getsize(path):
+                    return os.path.getsize(path), "skipped"
+
+            part = f"{path}.part"
+            headers = dict(self.headers or {})
+            downloaded = os.path.getsize(part) if os.path.exists(part) else 0
+            if downloaded > 0:
+                headers["Range"] = f"bytes={downloaded}-"
+
+            res = self.session.get(url, headers=headers, stream=True)
+            if res.status_code == 416 and downloaded > 0:
+                res.close()
+                # The file was complete but not renamed yet (e.g. the process stopped
+                # just before). Otherwise, the file is downloaded again
+                size = res.headers.get("Content-Range", "").rpartition("/")[2]
+                if size == str(downloaded):
+                    os.replace(part, path)
+                    return downloaded, "resumed"
+                downloaded = 0
+                headers.pop("Range")
+                res = self.session.get(url, headers=headers, stream=True)
+
+            with res:
+                res.raise_for_status()
+                # If the server doesn't support ranges (200 instead of 206),
+                # the whole file is sent again
+                resumed = downloaded > 0 and res.status_code == 206
+                with open(part, "ab" if resumed else "wb") as f:
+                    for chunk in res.iter_content(chunk_size=chunk_size):
+                        f.write(chunk)
+
+            os.replace(part, path)
+        except (requests.RequestException, OSError) as e:
+            logging.error(f"Unable to download {url}: {e}")
+            return None, "failed"
+
+        return os.path.getsize(path), "resumed" if resumed else "downloaded"
+
+    def export(
+        self, directory: str, format: str = "parquet", partition_by_date: bool = True
+    ) -> dict:
+        """Write `data` and the DFs of the repeat groups to Parquet ('parquet') or Arrow IPC ('arrow')
+        files in the folder `directory`: `data` in the sub folder 'data' and each repeat group in
+        a sub folder named after it. The columns are typed based on the questions of the form
+        (as with `coerce_types`) and the rows of the repeat groups have a column '_submission__id'
+        with the `_id` of their submission.
+
+        If `partition_by_date` is True, the files are partitioned by date of submission
+        (sub folders 'submission_date=YYYY-MM-DD').
+
+        The exports are append-only: only the submissions newer (greater `_id`) than the last
+        one exported to `directory` are written, to new files. The files already written are never
+        modified, so the submissions edited after their export are not updated.
+        Return the number of rows written per table."""
+
+        if pa is None:
+            raise ImportError("Exporting the data requires the package 'pyarrow'.")
+
+        if format not in FORMATS:
+            raise ValueError(
+                f"'{format}' is not an accepted value for the parameter 'format'. Accepted values are 'parquet' or 'arrow'."
+            )
+
+        if self.data is None or self.data.empty:
+            return {}
+
+        os.makedirs(directory, exist_ok=True)
+        last_id = read_last_id(directory)
+
+        data = self._as_names(self.data, self.__root_structure)
+        plan = self._dtype_plan(self.__root_structure)
+        plan.update({"_id": "Int64", "_submission_time": "datetime64[ns, UTC]"})
+        self._coerce_types(data, plan)
+
+        # `_id` and date of the submission of the rows of each table, by '_index'
+        submissions = {
+            None: pd.DataFrame(
+                {
+                    "_id": data["_id"].values,
+                    "date": data["_submission_time"].dt.date.values,
+                },
+                index=data["_index"].values,
+            )
+        }
+        frames = {"data": (data, submissions[None])}
+        for k, structure in self.__repeats_structure.items():
+            if k not in self.repeats:
+                continue
+
+            v = self._as_names(self.repeats[k], structure["columns"])
+            plan = self._dtype_plan(structure["columns"])
+            self._coerce_types(v, plan)
+
+            rows = submissions[structure["parent"]].loc[v["_parent_index"].values]
+            submissions[k] = rows.set_axis(v["_index"].values)
+            v["_submission__id"] = rows["_id"].values
+            frames[k] = (v, submissions[k])
+
+        nb_rows = {}
+        for k, (df, rows) in frames.items():
+            if partition_by_date:
+                df[PARTITION_COLUMN] = rows["date"].values
+
+            if last_id is not None:
+                df = df[(rows["_id"] > last_id).values]
+
+            nb_rows[k] = len(df)
+            if len(df) > 0:
+                write_table(
+                    to_arrow_table(df),
+                    os.path.join(directory, k),
+                    format,
+                    partition_by_date,
+                )
+
+        new_last_id = int(data["_id"].max())
+        if last_id is None or new_last_id > last_id:
+            write_last_id(directory, new_last_id)
+
+        return nb_rows
+
+    def _as_names(self, df: pd.DataFrame, structure: list) -> pd.DataFrame:
+        """Return a copy of `df` whose columns and choices use the names of the questions and
+        of the choices, whatever the way they are displayed (see `display`)."""
+        df = df.copy()
+        if self.__choices_as != "name":
+            self._change_choices(df, structure, "name")
+        if self.__columns_as != "name":
+            self._rename_frame_columns(df, structure, self.__columns_as, "name")
+        return df
+
     def _get_survey(self) -> None:
         """Go through all the elements of the survey and build the root structure (and the structure
         of the repeat groups if any) as a list of `Question` objects. Each `Question` object has a name
         and a label so it's possible to display the data using any of the two."""
 
-        if not self.__asset:
-            self._fetch_asset()
-
         if "naming_conflicts" in self.__asset["summary"]:
             self.naming_conflicts = self.__asset["summary"]["naming_conflicts"]
 
         survey = self.__content["survey"]
 
-        group_name = None
-        group_label = None
-        repeat_name = None
-        repeat_label = None
-        in_repeat = False
+        # Groups and repeat groups can be nested so we keep track of all the
+        # groups (and repeat groups) the current field is in. The field belongs
+        # to the innermost ones
+        groups = []
+        repeats = []
+        # Names of all the groups and repeat groups containing the current field,
+        # from the outermost, as in the paths of the questions in the submissions
+        path = []
 
         for field in survey:
             # Identify groups and repeats if any
+            if field["type"] in ["begin_group", "begin_repeat"]:
+                path.append(field["name"])
+
+            if field["type"] in ["end_group", "end_repeat"] and path:
+                path.pop()
+
+            # Label of the group or of the repeat group begun by the field
+            label_g = _intern(field["label"][0]) if "label" in field else None
+
             if field["type"] == "begin_group":
-                group_name = field["name"]
-                if "label" in field:
-                    group_label = field["label"]
+                groups.append((field["name"], label_g))
 
             if field["type"] == "begin_repeat":
-                repeat_name = field["name"]
-                if "label" in field:
-                    repeat_label = field["label"]
+                parent = repeats[-1][0] if repeats else None
+                repeats.append((field["name"], label_g))
 
-                in_repeat = True
                 self.has_repeats = True
-                self.__repeats_structure[repeat_name] = {}
-                self.__repeats_structure[repeat_name]["columns"] = []
-                self.__repeats_structure[repeat_name]["has_geo"] = False
-                self.__repeats_structure[repeat_name]["geo"] = False
+                self.__repeats_structure[field["name"]] = {}
+                self.__repeats_structure[field["name"]]["columns"] = []
+                self.__repeats_structure[field["name"]]["has_geo"] = False
+                self.__repeats_structure[field["name"]]["geo"] = []
+                # Name of the repeat group containing this one (None if at the root)
+                self.__repeats_structure[field["name"]]["parent"] = parent
 
-            if field["type"] == "end_group":
-                group_name = None
-                group_label = None
+            if field["type"] == "end_group" and groups:
+                groups.pop()
 
-            if field["type"] == "end_repeat":
-                in_repeat = False
-                repeat_name = None
-                repeat_label = None
+            if field["type"] == "end_repeat" and repeats:
+                repeats.pop()
+
+            group_name, group_label = groups[-1] if groups else (None, None)
+            repeat_name, repeat_label = repeats[-1] if repeats else (None, None)
+            in_repeat = repeat_name is not None
 
             if (
                 field["type"] != "begin_group"
@@ -257,10 +1105,11 @@ class KoboForm:
                 ):
                     name_q = f"{name_q}_001"
 
-                q = Question(name_q, field["type"], label_q)
+                q = Question(_intern(name_q), _intern(field["type"]), _intern(label_q))
+                q.xpath = _intern("/".join(path + [name_q]))
 
                 if field["type"] == "select_one" or field["type"] == "select_multiple":
-                    q.select_from_list_name = field["select_from_list_name"]
+                    q.select_from_list_name = _intern(field["select_from_list_name"])
 
                 q.group_name = group_name
                 q.group_label = group_label
@@ -286,9 +1135,15 @@ class KoboForm:
             for k, repeat in self.__repeats_structure.items():
                 self._rename_columns_labels_duplicates(repeat["columns"])
 
+        # The columns of the coordinates of the geopoints, added when building the data
+        self.__root_structure = self._add_geo_columns(self.__root_structure)
+        for repeat in self.__repeats_structure.values():
+            repeat["columns"] = self._add_geo_columns(repeat["columns"])
+
     def _get_choices(self):
         """For all the questions of type 'select_one' or 'select_multiple' assign their corresponding choices.
         Each choice has a name and label so it's possible to display the data using any of the two.
+        The questions using the same list of choices share the same list.
         """
 
         formatted_choices = {}
@@ -297,7 +1152,7 @@ class KoboForm:
             if choice["list_name"] not in formatted_choices:
                 formatted_choices[choice["list_name"]] = []
             formatted_choices[choice["list_name"]].append(
-                {"name": choice["name"], "label": choice["label"][0]}
+                {"name": _intern(choice["name"]), "label": _intern(choice["label"][0])}
             )
 
         for q in self.__root_structure:
@@ -311,41 +1166,131 @@ class KoboForm:
                         q.choices = formatted_choices[q.select_from_list_name]
 
     def _change_choices(
-        self, df: pd.DataFrame, structure: list, choices_as: str
+        self,
+        df: pd.DataFrame,
+        structure: list,
+        choices_as: str,
+        initial_choices_as: str = None,
+        initial_separator: str = None,
     ) -> None:
         """Change the choices for the columns of type 'select_one' and 'select_multiple'
-        from name to label and vice versa."""
+        from name to label and vice versa. By default the choices of `df` are expected to be
+        displayed as the ones of `data`. Otherwise, `initial_choices_as` and `initial_separator`
+        give how they are displayed (for DFs built from new submissions, in which the columns
+        are always named with the names of the questions)."""
+
+        columns_as = self.__columns_as
+        if initial_choices_as is None:
+            initial_choices_as = self.__choices_as
+        else:
+            columns_as = "name"
+        if initial_separator is None:
+            initial_separator = self.__initial_separator
+
         for q in structure:
+            if q.type not in ["select_one", "select_multiple"] or not q.choices:
+                continue
+
+            column = getattr(q, columns_as)
+            if column not in df.columns:
+                continue
+
+            if isinstance(df[column].dtype, pd.CategoricalDtype):
+                self._change_categories(
+                    df, column, q.choices, choices_as, initial_choices_as
+                )
+                continue
+
+            # The choices are changed once per distinct value of the column
+            # and the new values are put back in place with the codes of the values
+            codes, uniques = pd.factorize(df[column])
+            if len(uniques) == 0:
+                continue
+
             if q.type == "select_one":
-                column = getattr(q, self.__columns_as)
-                for choice in q.choices:
-                    df.loc[df[column] == choice[self.__choices_as], column] = choice[
-                        choices_as
-                    ]
+                mapping = {c[initial_choices_as]: c[choices_as] for c in q.choices}
+                new_uniques = [mapping.get(u, u) for u in uniques]
 
             # Multiple choices
             if q.type == "select_multiple":
-                column = getattr(q, self.__columns_as)
-                unique_values = list(df[column].unique())
+                new_uniques = self._change_multiple_choices(
+                    uniques,
+                    q.choices,
+                    choices_as,
+                    initial_choices_as,
+                    initial_separator,
+                )
 
-                for unique in unique_values:
-                    if pd.isna(unique):
-                        pass
-                    else:
-                        combinations = unique.split(self.__initial_separator)
-                        new_choices = [
-                            c[choices_as]
-                            for c in q.choices
-                            if c[self.__choices_as] in combinations
-                        ]
-                        new_choices_formatted = f"{self.separator}".join(new_choices)
+            new_values = np.asarray(new_uniques, dtype=object)[codes]
+            new_values[codes == -1] = np.nan
+            # Keep the columns of Arrow strings as such
+            if isinstance(df[column].dtype, pd.StringDtype):
+                new_values = pd.array(new_values, dtype=df[column].dtype)
+            df[column] = new_values
+
+    def _change_categories(
+        self,
+        df: pd.DataFrame,
+        column: str,
+        choices: list,
+        choices_as: str,
+        initial_choices_as: str,
+    ) -> None:
+        """Change the choices of a categorical column by renaming its categories."""
+        mapping = {c[initial_choices_as]: c[choices_as] for c in choices}
+        categories = list(df[column].cat.categories)
+        new_categories = [mapping.get(c, c) for c in categories]
+
+        if len(set(new_categories)) == len(new_categories):
+            df[column] = df[column].cat.rename_categories(new_categories)
+        else:
+            # Several choices have the same label so their categories are merged
+            df[column] = pd.Categorical(
+                df[column].map(dict(zip(categories, new_categories))).astype(object),
+                categories=list(dict.fromkeys(new_categories)),
+            )
 
-                        df.loc[df[column] == unique, column] = new_choices_formatted
+    def _change_multiple_choices(
+        self,
+        values,
+        choices: list,
+        choices_as: str,
+        initial_choices_as: str,
+        initial_separator: str,
+    ) -> list:
+        """Change the choices of the distinct values `values` of a column of type 'select_multiple'.
+        In the new values, the choices are ordered as in the list of choices and separated by
+        `self.separator`. The choices which are not in the list are dropped."""
+
+        positions = {}
+        mapping = {}
+        for idx, c in enumerate(choices):
+            positions.setdefault(c[initial_choices_as], idx)
+            mapping.setdefault(c[initial_choices_as], c[choices_as])
+
+        tokens = pd.Series(values).astype(str).str.split(initial_separator).explode()
+        tokens = tokens[tokens.isin(positions.keys())]
+        tokens = tokens.reset_index().drop_duplicates()
+        tokens.columns = ["value", "choice"]
+        tokens["position"] = tokens["choice"].map(positions)
+        tokens["choice"] = tokens["choice"].map(mapping)
+        tokens.sort_values(["value", "position"], kind="mergesort", inplace=True)
+
+        new_values = tokens.groupby("value")["choice"].agg(self.separator.join)
+
+        return list(new_values.reindex(range(len(values)), fill_value=""))
 
     def _fetch_asset(self):
-        res = requests.get(url=self.url_asset, headers=self.headers)
-        self.__asset = res.json()
-        self.__content = res.json()["content"]
+        res = self._cached_get(self.url_asset)
+        self._load_asset(res.json())
+
+    def _load_asset(self, asset: dict) -> None:
+        self.__asset = asset
+        self.__content = asset["content"]
+
+    def _has_asset(self) -> bool:
+        # Once the structure is built, the asset isn't kept
+        return self.__asset is not None or bool(self.__root_structure)
 
     def _extract_from_asset(self, asset: dict) -> None:
         self.metadata["uid"] = asset["uid"]
@@ -364,38 +1309,512 @@ class KoboForm:
 
     def _rename_columns(self, old, new):
         """Used to change the columns names from name to label and vice versa"""
+        self._rename_frame_columns(self.data, self.__root_structure, old, new)
+
+        if self.has_repeats:
+            for k, repeat in self.__repeats_structure.items():
+                if k in self.repeats:
+                    self._rename_frame_columns(
+                        self.repeats[k], repeat["columns"], old, new
+                    )
+
+    def _rename_frame_columns(
+        self, df: pd.DataFrame, structure: list, old: str, new: str
+    ) -> None:
         dict_rename = {}
-        for q in self.__root_structure:
+        for q in structure:
             dict_rename[getattr(q, old)] = getattr(q, new)
 
-        self.data.rename(columns=dict_rename, inplace=True)
+            if self.one_hot and q.type == "select_multiple" and q.choices:
+                for c in q.choices:
+                    dict_rename[
+                        f"{getattr(q, old)}/{c[old]}"
+                    ] = f"{getattr(q, new)}/{c[new]}"
+
+        df.rename(columns=dict_rename, inplace=True)
+
+    def _iter_pages(
+        self,
+        page_size: int = None,
+        url: str = None,
+        params: dict = None,
+        stream: bool = False,
+    ):
+        """Yield the submissions of the form one page at a time by following the
+        `next` link returned by the API. If `page_size` is given, the first page is
+        requested with the parameters `start` and `limit` (the links returned by the
+        API keep them for the following pages).
+        If the first page can't be fetched, nothing is yielded.
+        `url` can be given to continue the pagination from a page other than the first one.
+        `params` are extra parameters sent with the request of the first page (the links
+        returned by the API keep them for the following pages).
+        If `stream` is True, each page is yielded as an iterator over the submissions parsed
+        while the response is downloaded."""
+
+        first_page = url is None
+        if first_page:
+            url = self.url_data
+            params = dict(params or {})
+            if page_size is not None:
+                self._check_page_size(page_size)
+                params.update({"start": 0, "limit": page_size})
+            if not params:
+                params = None
+
+        while url:
+            if stream:
+                res = self._fetch_page_stream(url, params, first_page)
+                if res is None:
+                    return
+
+                content = {"nb_results": 0}
+                with res:
+                    results = self._parse_page_stream(res, content)
+                    yield results
+                    # In case the page wasn't read until the end
+                    for _ in results:
+                        pass
+                nb_results = content["nb_results"]
+            else:
+                content = self._fetch_page(url, params, first_page)
+                if content is None:
+                    return
+
+                results = content["results"]
+                nb_results = len(results)
+
+                yield results
+
+            # An empty page means that there is nothing left to fetch
+            if nb_results == 0:
+                return
+
+            first_page = False
+            url = content.get("next")
+            params = None
+
+    def _iter_pages_parallel(
+        self, page_size: int, max_workers: int, params: dict = None
+    ):
+        """Yield the submissions of the form one page at a time, the pages being
+        fetched in parallel by a pool of `max_workers` threads. The offsets of the
+        pages are computed from the number of submissions of the form.
+        `params` are extra parameters sent with the request of each page."""
+
+        if page_size is None:
+            page_size = DEFAULT_PAGE_SIZE
+        self._check_page_size(page_size)
+
+        num_submissions = self.metadata.get("num_submissions")
+
+        # The number of submissions matching a filter is given with the first page
+        first_page = None
+        if params and "query" in params:
+            first_page = self._fetch_page(
+                self.url_data, dict(params, start=0, limit=page_size), True
+            )
+            if first_page is None:
+                return
+            yield first_page["results"]
+            num_submissions = first_page.get("count")
+            if not first_page.get("next"):
+                return
+
+        # Without the number of submissions we can't know the pages in advance
+        if not num_submissions:
+            if first_page is not None:
+                yield from self._iter_pages(url=first_page["next"])
+            else:
+                yield from self._iter_pages(page_size, params=params)
+            return
+
+        start = 0 if first_page is None else page_size
+        offsets = range(start, num_submissions, page_size)
+
+        def fetch(start):
+            page_params = dict(params or {}, start=start, limit=page_size)
+            return self._fetch_page(self.url_data, page_params, start == 0)
+
+        next_url = None
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # `map` returns the pages in the order of the offsets
+            for content in executor.map(fetch, offsets):
+                if content is None:
+                    return
+                yield content["results"]
+                next_url = content.get("next")
+
+        # New submissions may have been received since the number of
+        # submissions was fetched
+        if next_url:
+            yield from self._iter_pages(url=next_url)
+
+    def _fetch_page(
+        self, url: str, params: dict, first_page: bool
+    ) -> Union[dict, None]:
+        """Fetch a page of submissions. If the first page can't be fetched, return `None`."""
+        res = self._cached_get(url, params)
 
-        if self.has_repeats:
-            for k, repeat in self.__repeats_structure.items():
-                dict_rename = {}
-                for q in repeat["columns"]:
-                    dict_rename[getattr(q, old)] = getattr(q, new)
-                self.repeats[k].rename(columns=dict_rename, inplace=True)
+        if res.status_code != 200:
+            if first_page:
+                return None
+            # Stopping silently in the middle of the pagination would
+            # return truncated data
+            res.raise_for_status()
+
+        if orjson is not None:
+            return orjson.loads(res.content)
+        return res.json()
+
+    def _fetch_page_stream(
+        self, url: str, params: dict, first_page: bool
+    ) -> Union[requests.Response, None]:
+        """Send the request for a page of submissions without downloading the body of the response.
+        If the first page can't be fetched, return `None`."""
+        res = self.session.get(
+            url=url, headers=self.headers, params=params, stream=True
+        )
 
-    def _extract_repeats(self, rows: list) -> None:
-        """Extract all the questions part of repeat groups into separate DFs
-        '_parent_index' is the column name used in Kobo in the child table
-        when downloading the data, that allows to join the data with the parent table
-        """
-        repeats = {}
-        for idx_parent, row in enumerate(rows):
+        if res.status_code != 200:
+            res.close()
+            if first_page:
+                return None
+            res.raise_for_status()
+
+        # Decompress the body if the server compressed it
+        res.raw.decode_content = True
+
+        return res
+
+    def _parse_page_stream(self, res: requests.Response, content: dict):
+        """Yield the submissions of a page one by one while its body is downloaded.
+        The other properties of the page (e.g. `next`) and the number of submissions
+        (`nb_results`) are stored in `content`."""
+        builder = None
+        for prefix, event, value in ijson.parse(res.raw, use_float=True):
+            if prefix == "results.item" and event == "start_map":
+                builder = ijson.ObjectBuilder()
+
+            if builder is not None:
+                builder.event(event, value)
+                if prefix == "results.item" and event == "end_map":
+                    content["nb_results"] += 1
+                    yield builder.value
+                    builder = None
+            elif "." not in prefix and event in ["string", "number", "null"]:
+                content[prefix] = value
+
+    def _cached_get(self, url: str, params: dict = None) -> requests.Response:
+        """Send a GET request, revalidating the cached response if the form has a cache.
+        The responses are cached by form and version of the form."""
+        key = None
+        if self.cache is not None:
+            key = self.cache.key(self.uid, self.metadata.get("version_id"), url, params)
+
+        return cached_get(self.session, self.cache, key, url, self.headers, params)
+
+    def _check_dtype_backend(self, dtype_backend: str) -> None:
+        if dtype_backend not in ["numpy", "pyarrow"]:
+            raise ValueError(
+                f"'{dtype_backend}' is not an accepted value for the parameter 'dtype_backend'. Accepted values are 'numpy' or 'pyarrow'."
+            )
+
+        if dtype_backend == "pyarrow" and pa is None:
+            raise ImportError(
+                "Fetching the data with dtype_backend='pyarrow' requires the package 'pyarrow'."
+            )
+
+    def _to_arrow_strings(self, columns) -> None:
+        """Convert the columns of `columns` (a dict of lists or a DF) which only contain
+        strings (and missing values) to Arrow arrays of strings."""
+        for column in list(columns.keys()):
+            values = columns[column]
+            if getattr(values, "dtype", object) != object:
+                continue
+            if pd.api.types.infer_dtype(values, skipna=True) == "string":
+                columns[column] = pd.array(values, dtype="string[pyarrow]")
+
+    def _check_page_size(self, page_size: int) -> None:
+        if page_size < 1:
+            raise ValueError("The value of 'page_size' has to be greater than 0.")
+
+    def _project(self, fields: list) -> Union[dict, None]:
+        """Select the columns to fetch and return the parameters of the requests of the data
+        (`None` if all the columns are fetched). Each element of `fields` is either:
+        the name or the label of a question, the name or the label of a group or a repeat group
+        (all the questions in it, at any depth) or a field of the submissions starting with '_'
+        (e.g. '_uuid', '_validation_status').
+
+        The paths of the questions (with their groups) are sent to the API in the parameter
+        `fields`. The answers of a repeat group can't be selected in the submissions so, for the
+        questions in a repeat group, the whole outermost repeat group containing it is fetched
+        and the other columns are dropped when the DFs are built."""
+
+        self.fields = fields
+        if fields is None:
+            self.__projection = None
+            return None
+
+        if len(fields) == 0:
+            raise ValueError("The value of 'fields' has to be a non-empty list.")
+
+        columns = {None: set(REQUIRED_FIELDS)}
+        paths = list(REQUIRED_FIELDS)
+        for field in fields:
+            selected = [
+                (table, q)
+                for table, q in self._questions()
+                if field in [q.name, q.label]
+            ]
+            # A group: all the questions whose path contains it
+            if not selected:
+                selected = [
+                    (table, q)
+                    for table, q in self._questions()
+                    if field in q.xpath.split("/")[:-1]
+                    or field in [q.group_label, q.repeat_label]
+                ]
+
+            if not selected:
+                if not field.startswith("_"):
+                    raise ValueError(
+                        f"'{field}' is not the name or the label of a question or a group of the form."
+                    )
+                columns[None].add(field)
+                paths.append(field)
+
+            for table, q in selected:
+                names = [q.name]
+                if q.type == "geopoint":
+                    names += [f"_{q.name}_{c}" for c in COORDINATES]
+                columns.setdefault(table, set()).update(names)
+
+                # The files attached are listed in the submissions, even for
+                # the questions of the repeat groups
+                if q.type in MEDIA_TYPES:
+                    columns[None].add("_attachments")
+                    paths.append("_attachments")
+
+                if table is None:
+                    paths.append(q.xpath)
+                    continue
+
+                # The path of the outermost repeat group containing the question. The
+                # repeat groups containing its one are kept so it can be joined to the data
+                repeat_paths = self._repeat_paths(q, table)
+                for k in self._repeat_chain(table)[:-1]:
+                    columns.setdefault(k, set())
+                paths.append(repeat_paths[0])
+
+        self.__projection = {"columns": columns}
+
+        return {"fields": json.dumps(list(dict.fromkeys(paths)))}
+
+    def _filter(self, query: dict) -> Union[dict, None]:
+        """Translate the filter `query` to a query of the API (parameter `query`, in the syntax
+        of MongoDB) and return it (`None` if there is no filter). The fields of the conditions
+        are names or labels of questions, or fields of the submissions starting with '_'
+        (e.g. '_submission_time', '_validation_status.uid', '_submitted_by'), for example:
+
+            {'consent': 'yes', '_submission_time': {'$gte': '2022-12-01'}}
+            {'$or': [{'age_hhh': {'$in': ['30', '31']}}, {'school': 'no'}]}
+
+        The names and labels are replaced by the paths of the questions in the submissions (see
+        `_query_path`). The values are sent as they are: the answers are stored as strings."""
+
+        self.query = query
+        if query is None:
+            return None
+
+        if not isinstance(query, dict):
+            raise ValueError(
+                "The value of 'query' has to be a dict (a query in the syntax of MongoDB)."
+            )
+
+        return self._resolve_query(query)
+
+    def _resolve_query(self, query):
+        if isinstance(query, list):
+            return [self._resolve_query(q) for q in query]
+
+        resolved = {}
+        for key, value in query.items():
+            if key in ["$and", "$or", "$nor"]:
+                resolved[key] = self._resolve_query(value)
+            elif key.startswith("$"):
+                resolved[key] = value
+            else:
+                resolved[self._query_path(key)] = value
+
+        return resolved
+
+    def _query_path(self, field: str) -> str:
+        """Return the path, in the submissions stored by the API, of the question whose name or label
+        is `field`. The answers of a question in a repeat group are in the lists of the children,
+        so the path goes through them (e.g. 'children.children/child_name') and the condition matches
+        the submissions with at least one child matching it."""
+        for table, q in self._questions():
+            if field in [q.name, q.label]:
+                if table is None:
+                    return q.xpath
+                return ".".join(self._repeat_paths(q, table) + [q.xpath])
+
+        if not field.startswith("_"):
+            raise ValueError(
+                f"'{field}' is not the name or the label of a question of the form."
+            )
+
+        return field
+
+    def _questions(self):
+        """Yield the questions of the form (without the coordinates of the geopoints)
+        with the name of their repeat group (`None` for the questions of the data)."""
+        tables = [(None, self.__root_structure)] + [
+            (k, repeat["columns"]) for k, repeat in self.__repeats_structure.items()
+        ]
+        for table, structure in tables:
+            for q in structure:
+                if q.type != "geo":
+                    yield table, q
+
+    def _repeat_chain(self, table: str) -> list:
+        """Return the names of the repeat groups containing the repeat group `table`,
+        from the outermost, followed by `table`."""
+        chain = [table]
+        while self.__repeats_structure[chain[0]]["parent"] is not None:
+            chain.insert(0, self.__repeats_structure[chain[0]]["parent"])
+        return chain
+
+    def _repeat_paths(self, q: Question, table: str) -> list:
+        """Return the paths of the repeat groups containing the question `q` of the repeat
+        group `table`, from the outermost."""
+        segments = q.xpath.split("/")
+        return [
+            "/".join(segments[: segments.index(k) + 1])
+            for k in self._repeat_chain(table)
+        ]
+
+    def _projected(self, structure: list, table: str = None) -> list:
+        """Return the questions of `structure` (of the data or of the repeat group `table`)
+        whose columns are fetched."""
+        if self.__projection is None:
+            return structure
+        columns = self.__projection["columns"].get(table, set())
+        return [q for q in structure if q.name in columns]
+
+    def _is_fetched(self, column: str, table: str = None) -> bool:
+        """Return whether the column `column`, which isn't the column of a question,
+        is fetched in the data or in the repeat group `table`."""
+        if self.__projection is None or column == "_index":
+            return True
+        return column in self.__projection["columns"].get(table, set())
+
+    def _process_page(self, rows, offset: int, repeats: dict) -> pd.DataFrame:
+        """Convert a page of submissions to a DF. The children of the repeat groups are
+        collected in `repeats`, `offset` being the number of rows already processed
+        in the previous pages. `rows` can be any iterable (e.g. the submissions parsed
+        one by one from the response): the values are appended to a list per column as
+        the submissions are read, so the submissions don't need to be kept in memory."""
+
+        columns = {}
+        nb_rows = 0
+        for row in rows:
             for column, value in row.items():
-                if not column.startswith("_") and type(value) == list:
-                    repeat_name = column.split("/")[-1]
-                    if repeat_name not in repeats:
-                        repeats[repeat_name] = []
-                    for child in value:
-                        child["_parent_index"] = idx_parent + 1
-                    repeats[repeat_name] = repeats[repeat_name] + value
+                # The repeat groups are extracted in separate DFs
+                if (
+                    self.has_repeats
+                    and not column.startswith("_")
+                    and type(value) == list
+                ):
+                    continue
+
+                values = columns.get(column)
+                if values is None:
+                    values = columns[column] = []
+                # The JSON object of a submission doesn't have the empty columns
+                if len(values) < nb_rows:
+                    values.extend([np.nan] * (nb_rows - len(values)))
+                values.append(value)
+
+            if self.has_repeats:
+                self._collect_children([row], offset + nb_rows + 1, repeats)
+
+            nb_rows += 1
+
+        for values in columns.values():
+            if len(values) < nb_rows:
+                values.extend([np.nan] * (nb_rows - len(values)))
+
+        if self.dtype_backend == "pyarrow":
+            self._to_arrow_strings(columns)
+
+        df = pd.DataFrame(columns)
+
+        self._remove_unused_columns(df)
 
+        # For columns containing the group(s) they belong to in their name, remove it to only
+        # keep the name of the column
+        __dict_rename = {}
+        for c in df.columns:
+            __dict_rename[c] = c.split("/")[-1]
+
+        df.rename(columns=__dict_rename, inplace=True)
+
+        if self.has_repeats:
+            # The columns containing the repeat groups are not in the parent DF.
+            # In the API there is a column with the same name as the name of
+            # the repeat group + the suffix '_count' just before the repeat group.
+            # We can delete it
+            repeat_names = set(self.__repeats_structure.keys()) | set(repeats.keys())
+            to_delete = list(repeat_names) + [f"{c}_count" for c in repeat_names]
+            df.drop(columns=to_delete, inplace=True, errors="ignore")
+
+        return df
+
+    def _collect_children(self, rows: list, first_index: int, repeats: dict) -> None:
+        """Go through the children of the repeat groups of `rows` (at any depth) and append them
+        to the list of their repeat group in `repeats`. Each child gets an '_index' (its position
+        in its repeat group) and a '_parent_index' (the '_index' of its parent, i.e. the submission
+        or the child of the repeat group containing it). `first_index` is the '_index' of the first
+        row of `rows`. The rows aren't modified: the children are shallow copies without the
+        repeat groups nested in them."""
+
+        # The levels are visited in the order they are found so the children of a repeat
+        # group are appended in the order of their parents
+        levels = deque([(rows, first_index)])
+        while levels:
+            level_rows, level_first_index = levels.popleft()
+            for idx, row in enumerate(level_rows, start=level_first_index):
+                for column, value in row.items():
+                    if column.startswith("_") or type(value) != list:
+                        continue
+
+                    children = repeats.setdefault(column.split("/")[-1], [])
+                    levels.append((value, len(children) + 1))
+                    for child in value:
+                        record = {c: v for c, v in child.items() if type(v) != list}
+                        record["_index"] = len(children) + 1
+                        record["_parent_index"] = idx
+                        children.append(record)
+
+    def _extract_repeats(self, repeats: dict) -> dict:
+        """Convert the children of the repeat groups collected while processing the pages
+        into separate DFs. '_parent_index' is the column name used in Kobo in the child table
+        when downloading the data, that allows to join the data with the parent table
+        (or with the table of the repeat group containing it, on its column '_index')
+        """
         for repeat_name, repeat_data in repeats.items():
             repeats[repeat_name] = pd.DataFrame(repeat_data)
 
+            # Repeat group of submissions made with an older version of the form
+            if repeat_name not in self.__repeats_structure:
+                self.__repeats_structure[repeat_name] = {
+                    "columns": [],
+                    "has_geo": False,
+                    "geo": [],
+                    "parent": None,
+                }
+
             # If columns have a prefix composed of all their groups,
             # remove them
             dict_rename = {}
@@ -403,12 +1822,15 @@ class KoboForm:
                 dict_rename[c] = c.split("/")[-1]
             repeats[repeat_name].rename(columns=dict_rename, inplace=True)
 
-            self.has_repeats = True
-            self.repeats = repeats
+            # The columns containing the number of children of the nested repeat groups
+            to_delete = [f"{c}_count" for c in self.__repeats_structure]
+            repeats[repeat_name].drop(columns=to_delete, inplace=True, errors="ignore")
 
-    def _remove_unused_columns(self) -> None:
+        return repeats
+
+    def _remove_unused_columns(self, df: pd.DataFrame) -> None:
         """Remove the columns in the list `columns` if they are in the
-        main `self.data` (before extracting the repeats)"""
+        DF `df` containing the main data (before extracting the repeats)"""
 
         columns = [
             "_version_",
@@ -420,10 +1842,10 @@ class KoboForm:
         ]
 
         # We only try to delete the columns that are in the DataFrame
-        to_delete = [c for c in columns if c in self.data.columns]
+        to_delete = [c for c in columns if c in df.columns]
 
         if len(to_delete) > 0:
-            self.data.drop(to_delete, axis=1, inplace=True)
+            df.drop(to_delete, axis=1, inplace=True)
 
     def _rename_columns_labels_duplicates(self, structure: list) -> None:
         """Identify the duplicates among the labels of all columns in ``structure`.
@@ -441,79 +1863,93 @@ class KoboForm:
                 duplicates_count[q.label] += 1
                 q.label = f"{q.label} ({duplicates_count[q.label]})"
 
-    def _obtain_url(self, row, column):
-        """Aux Function to obtain url of an attached file.
-        Replaces the ' ' (spaces) by '_' from the attached files"""
-
-        df = pd.json_normalize(row["_attachments"])
-        if "filename" in df.columns:
-            df["filename_ok"] = df["filename"].apply(
-                lambda x: x.split("/")[-1].replace(" ", "_")
+    def _add_geo_columns(self, structure: list) -> list:
+        """Return `structure` with, after each question of type 'geopoint', the questions of
+        its 4 coordinates '_<name>_latitude', '_<name>_longitude', '_<name>_altitude'
+        and '_<name>_precision'."""
+        new_structure = []
+        for q in structure:
+            new_structure.append(q)
+            if q.type == "geopoint":
+                new_structure += [
+                    Question(_intern(f"_{q.name}_{c}"), "geo", f"_{q.label}_{c}")
+                    for c in COORDINATES
+                ]
+        return new_structure
+
+    def _split_gps_coords(self, data: pd.DataFrame, repeats: dict) -> None:
+        """Split the columns of type 'geopoint' (of the data and of the repeat groups) into
+        4 new columns of float64 '_<name>_latitude', '_<name>_longitude', '_<name>_altitude'
+        and '_<name>_precision'. The columns are expected to be named with the names of the
+        questions."""
+
+        tables = [(data, self.geo)]
+        for repeat_name, repeat in self.__repeats_structure.items():
+            if repeat["has_geo"] and repeat_name in repeats:
+                tables.append((repeats[repeat_name], repeat["geo"]))
+
+        for df, geo in tables:
+            for g in geo:
+                if g.name not in df.columns:
+                    continue
+                coords = parse_geopoints(df[g.name])
+                for idx, c in enumerate(COORDINATES):
+                    df[f"_{g.name}_{c}"] = coords[:, idx]
+
+    def to_geodataframe(self, question: str = None, repeat: str = None):
+        """Return `data` (or the DF of the repeat group `repeat`) as a GeoDataFrame (requires
+        the package `geopandas`) whose geometry, in longitude/latitude (EPSG:4326), is built
+        from the answers of the question `question` of type 'geopoint' (points), 'geotrace'
+        (line strings) or 'geoshape' (polygons). By default, the first of these questions is used.
+        The answers which aren't valid geometries have no geometry."""
+
+        # geopandas is slow to import so it's only imported when needed
+        try:
+            import geopandas
+        except ImportError:
+            raise ImportError(
+                "Building a GeoDataFrame requires the package 'geopandas'."
             )
 
-            if pd.isna(row[column]):
-                name = None
-            else:
-                name = row[column].replace(" ", "_")
-
-            if name is not None:
-                matching_rows = df.loc[df["filename_ok"] == name]
-                if not matching_rows.empty:
-                    url = matching_rows["download_url"].iloc[0]
-                else:
-                    url = np.nan
-            else:
-                url = np.nan
-            return url
-
-    def _split_gps_coords(self) -> None:
-        """Split the columns of type 'geopoint' into 4 new columns
-        'latitude', 'longitude', 'altitude', 'gps_precision'
-        """
-
-        base_geo_columns = ["latitude", "longitude", "altitude", "precision"]
-
-        for g in self.geo:
-            index_geo = self.__root_structure.index(g)
-            new_geo_names = [f"_{g.name}_{c}" for c in base_geo_columns]
-            new_geo_labels = [f"_{g.label}_{c}" for c in base_geo_columns]
-
-            for idx, c in enumerate(new_geo_names):
-                q = Question(c, "geo", new_geo_labels[idx])
-                self.__root_structure.insert(index_geo + idx + 1, q)
-
-            self.data[new_geo_names] = self.data[g.name].str.split(" ", expand=True)
+        if repeat is None:
+            df, structure = self.data, self.__root_structure
+        else:
+            df, structure = (
+                self.repeats[repeat],
+                self.__repeats_structure[repeat]["columns"],
+            )
 
-        # XXX This has not been tested
-        if self.has_repeats:
-            for repeat_name, repeat in self.__repeats_structure.items():
-                if repeat["has_geo"]:
-                    for g in repeat["geo"]:
-                        index_geo = repeat["columns"].index(g)
-                        new_geo_names = [f"_{g.name}_{c}" for c in base_geo_columns]
-                        new_geo_labels = [f"_{g.label}_{c}" for c in base_geo_columns]
+        questions = [q for q in structure if q.type in GEO_TYPES]
+        if question is not None:
+            questions = [q for q in questions if question in [q.name, q.label]]
+        if not questions:
+            raise ValueError(
+                f"There is no question of type {GEO_TYPES} named '{question}'."
+                if question is not None
+                else f"There is no question of type {GEO_TYPES}."
+            )
 
-                        for idx, c in enumerate(new_geo_names):
-                            q = Question(c, "geo", new_geo_labels[idx])
-                            repeat["columns"].append(index_geo + idx + 1, q)
+        q = questions[0]
+        geometry = to_geometry(df[getattr(q, self.__columns_as)], q.type)
 
-                        self.data[new_geo_names] = self.repeats[repeat_name][
-                            g.name
-                        ].str.split(" ", expand=True)
+        return geopandas.GeoDataFrame(df, geometry=geometry, crs="EPSG:4326")
 
     def download_form(self, format: str) -> None:
         """Given the uid of a form and a format ('xls' or 'xml')
         download the form in that format in the current directory"""
 
-        if format not in ["xls", "xml"]:
-            raise ValueError(
-                f"The file format '{format}' is not supported. Recognized formats are 'xls' and 'xml'"
-            )
-
-        URL = f"{self.base_url}/{self.uid}.{format}"
+        URL = self._form_url(format)
         filename = URL.split("/")[-1]
 
-        r = requests.get(URL, headers=self.headers)
+        r = self.session.get(URL, headers=self.headers)
 
         with open(filename, "wb") as f:
             f.write(r.content)
+
+    def _form_url(self, format: str) -> str:
+        if format not in ["xls", "xml"]:
+            raise ValueError(
+                f"The file format '{format}' is not supported. Recognized formats are 'xls' and 'xml'"
+            )
+
+        return f"{self.base_url}/{self.uid}.{format}"
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+try:
+    import shapely
+except ImportError:  # pragma: no cover
+    shapely = None
+
+# Coordinates of a point in the answers of the questions of type 'geopoint', 'geotrace'
+# and 'geoshape' (the points of a trace or a shape are separated by ';')
+COORDINATES = ["latitude", "longitude", "altitude", "precision"]
+
+GEO_TYPES = ["geopoint", "geotrace", "geoshape"]
+
+
+def parse_geopoints(values: pd.Series) -> np.ndarray:
+    """Parse the answers of a question of type 'geopoint' ('<latitude> <longitude> <altitude>
+    <precision>') into an array of float64 with one row per answer and one column per coordinate
+    (see `COORDINATES`). The missing answers and coordinates, and the ones which aren't numbers,
+    are NaN."""
+    coords = np.full((len(values), len(COORDINATES)), np.nan)
+
+    # Without any answer the column may not be a column of strings
+    tokens = values.reset_index(drop=True).astype(object).str.split()
+    tokens = tokens.dropna().explode()
+    tokens = tokens[tokens.notna()]
+    if len(tokens) == 0:
+        return coords
+
+    # Position of each coordinate in its answer
+    position = tokens.groupby(level=0).cumcount().to_numpy()
+    keep = position < len(COORDINATES)
+    rows = tokens.index.to_numpy()[keep]
+    coords[rows, position[keep]] = pd.to_numeric(
+        tokens[keep], errors="coerce"
+    ).to_numpy(dtype=float)
+
+    return coords
+
+
+def parse_geotraces(values: pd.Series) -> tuple:
+    """Parse the answers of a question of type 'geotrace' or 'geoshape' (points separated by ';').
+    Return the coordinates of all the points (see `parse_geopoints`) and, for each point,
+    the position of the answer it belongs to."""
+    points = values.reset_index(drop=True).astype(object).str.split(";")
+    points = points.dropna().explode()
+    points = points[points.notna() & (points.astype(str).str.strip() != "")]
+
+    return parse_geopoints(points), points.index.to_numpy()
+
+
+def to_geometry(values: pd.Series, type: str) -> np.ndarray:
+    """Build the shapely geometries (points, line strings or polygons according to the type of
+    the question) of the answers of a question of type 'geopoint', 'geotrace' or 'geoshape',
+    in longitude/latitude. The answers which aren't valid geometries are `None`."""
+    if shapely is None:
+        raise ImportError("Building the geometries requires the package 'shapely'.")
+
+    if type == "geopoint":
+        coords = parse_geopoints(values)
+        geometries = shapely.points(coords[:, 1], coords[:, 0])
+        geometries[np.isnan(coords[:, :2]).any(axis=1)] = None
+        return geometries
+
+    coords, rows = parse_geotraces(values)
+    valid = ~np.isnan(coords[:, :2]).any(axis=1)
+    coords, rows = coords[valid], rows[valid]
+
+    # A line needs 2 points and a polygon 4 (the first point being repeated at the end)
+    nb_points = np.bincount(rows, minlength=len(values))
+    min_points = 2 if type == "geotrace" else 4
+    enough = nb_points[rows] >= min_points
+    coords, rows = coords[enough], rows[enough]
+
+    geometries = np.full(len(values), None, dtype=object)
+    if len(rows) == 0:
+        return geometries
+
+    # The geometries are built for the rows with points, in the order of the rows
+    positions, indices = np.unique(rows, return_inverse=True)
+    lon_lat = coords[:, [1, 0]]
+    if type == "geotrace":
+        built = shapely.linestrings(lon_lat, indices=indices)
+    else:
+        built = shapely.polygons(shapely.linearrings(lon_lat, indices=indices))
+    geometries[positions] = built
+
+    return geometries
@@ -2,20 +2,57 @@ import json
 import logging
 import os
 import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Union
 
 import requests
 
+from .cache import ResponseCache
 from .form import KoboForm
+from .session import create_session
+
+# Result of the synchronization of a form by `Manager.sync_forms`. `error` is the exception
+# raised while fetching the form (`None` if it succeeded)
+SyncResult = namedtuple("SyncResult", ["uid", "form", "error"])
 
 
 class Manager:
-    def __init__(self, url: str, api_version: int, token: str) -> None:
+    def __init__(
+        self,
+        url: str,
+        api_version: int,
+        token: str,
+        pool_size: int = 10,
+        max_retries: int = 3,
+        backoff_factor: float = 0.5,
+        cache_dir: str = None,
+        cache_max_size: int = 500 * 1024 * 1024,
+        rate_limit: float = None,
+        forms_page_size: int = 100,
+        forms_ttl: float = 300,
+    ) -> None:
         self.url = url.rstrip("/")
         self.api_version = api_version
         self.token = token
         self.headers = {"Authorization": f"Token {token}"}
+        # Number of forms per page when fetching the list of forms
+        self.forms_page_size = forms_page_size
+        # Number of seconds after which the list of forms is fetched again (`None`: never)
+        self.forms_ttl = forms_ttl
+        # Metadata of the forms by uid
         self._assets = None
+        self._assets_fetched_at = None
+        # Session shared by the manager and all the forms it creates, so
+        # the connections to the server are reused between the requests,
+        # sending at most `rate_limit` requests per second to the server (if given)
+        self.session = create_session(
+            pool_size, max_retries, backoff_factor, rate_limit
+        )
+        # Cache on disk of the responses for the assets and the data of the forms
+        self.cache = None
+        if cache_dir is not None:
+            self.cache = ResponseCache(cache_dir, cache_max_size)
 
     @property
     def api_version(self):
@@ -27,66 +64,171 @@ class Manager:
             raise ValueError("The value of 'api_version' has to be: 2.")
         self._api_version = value
 
-    def _fetch_forms(self) -> None:
-        """Fetch the list of forms the user has access to with its token."""
-        url_assets = f"{self.url}/api/v{self.api_version}/assets.json"
-
-        res = requests.get(url=url_assets, headers=self.headers)
-
-        # If error while fetching the data, return an empty list
-        if res.status_code != 200:
-            return []
-
-        results = res.json()["results"]
+    def _fetch_forms(self) -> Union[list, None]:
+        """Fetch the list of forms the user has access to with its token.
+        The list is fetched page by page (`forms_page_size` forms per page).
+        Return `None` if the first page can't be fetched."""
+        url = f"{self.url}/api/v{self.api_version}/assets.json"
+        # Only the forms (not the questions and blocks of the library)
+        params = {"q": "asset_type:survey", "limit": self.forms_page_size}
+
+        results = []
+        first_page = True
+        while url:
+            res = self.session.get(url=url, headers=self.headers, params=params)
+
+            # If error while fetching the data, return None (unlike no forms)
+            if res.status_code != 200:
+                if first_page:
+                    return None
+                res.raise_for_status()
+
+            content = res.json()
+            results += content["results"]
+
+            first_page = False
+            url = content.get("next")
+            # The link to the next page already contains the parameters
+            params = None
 
         # It seems that when uploading an XLSForm from the website to create
         # a new form and there is an issue during the upload, the form
         # will be visible in the API but not in the UI. In this case it will
         # have the property "asset_type" set to "empty" instead of "survey"
-        # for a working form. We don't want to keep them so we filter them out.
+        # for a working form. We don't want to keep them so we filter them out
+        # (in case the server ignores the parameter `q`).
         # This issue seems to be very rare.
         results = [r for r in results if r["asset_type"] != "empty"]
 
         return results
 
+    def _fetch_form(self, uid: str) -> Union[dict, None]:
+        """Fetch the asset of a single form (`None` if it can't be fetched)."""
+        url = f"{self.url}/api/v{self.api_version}/assets/{uid}.json"
+        res = self.session.get(url=url, headers=self.headers)
+
+        if res.status_code != 200:
+            return None
+
+        return res.json()
+
+    def _get_assets(self) -> dict:
+        """Return the assets of the forms by uid. They are fetched if they haven't been
+        fetched yet or if they were fetched more than `forms_ttl` seconds ago."""
+        expired = (
+            self.forms_ttl is not None
+            and self._assets_fetched_at is not None
+            and time.monotonic() - self._assets_fetched_at > self.forms_ttl
+        )
+        if self._assets is None or expired:
+            forms = self._fetch_forms()
+            # An error isn't cached, the list is fetched again by the next call
+            if forms is None:
+                return {} if self._assets is None else self._assets
+
+            self._assets = {form["uid"]: form for form in forms}
+            self._assets_fetched_at = time.monotonic()
+
+        return self._assets
+
+    def invalidate_forms(self) -> None:
+        """Forget the list of forms so it's fetched again by the next call to
+        `get_forms` or `get_form` (e.g. after a form was created)."""
+        self._assets = None
+        self._assets_fetched_at = None
+
     def _create_koboform(self, form: dict) -> KoboForm:
-        kform = KoboForm(uid=form["uid"])
+        kform = KoboForm(uid=form["uid"], session=self.session, cache=self.cache)
         kform._extract_from_asset(form)
         kform.headers = self.headers
 
+        # The asset of a single form comes with its content
+        if "content" in form:
+            kform._load_asset(form)
+
         return kform
 
     def get_forms(self) -> list:
-        if not self._assets:
-            self._assets = self._fetch_forms()
-
         kforms = []
-        for form in self._assets:
+        for form in self._get_assets().values():
             kform = self._create_koboform(form)
             kforms.append(kform)
         return kforms
 
     def get_form(self, uid: str) -> Union[KoboForm, None]:
-        if not self._assets:
-            self._assets = self._fetch_forms()
+        assets = self._get_assets()
 
-        # If no forms
-        if self._assets == []:
-            return None
+        form = assets.get(uid)
 
-        form_list = [f for f in self._assets if f["uid"] == uid]
+        # The form may have been created after the list was fetched
+        if form is None:
+            form = self._fetch_form(uid)
 
-        if len(form_list) == 0:
-            raise ValueError(f"There is no form with the uid: {uid}.")
+            if form is None:
+                # If no forms
+                if not assets:
+                    return None
+                raise ValueError(f"There is no form with the uid: {uid}.")
+
+            kform = self._create_koboform(form)
+            # Only the metadata are kept in the list, as for the other forms
+            assets[uid] = {k: v for k, v in form.items() if k != "content"}
+
+            return kform
 
-        form = form_list[0]
         kform = self._create_koboform(form)
 
         return kform
 
+    def sync_forms(self, uids: list = None, max_workers: int = 4, **kwargs):
+        """Fetch the asset and the data of the forms whose uid is in `uids` (all the forms
+        if `uids` is `None`) concurrently, with a pool of `max_workers` threads. `kwargs` are
+        passed to `KoboForm.fetch_data` (e.g. `page_size`).
+
+        Yield a `SyncResult` (`uid`, `form`, `error`) for each form as soon as it's finished,
+        in the order they finish. A form failing doesn't stop the others: its `error` is the
+        exception raised and its `form` is `None`.
+
+        The threads share the session of the manager, so `pool_size` should be at least
+        `max_workers` and `rate_limit` limits the number of requests for all of them."""
+
+        # The list of forms is fetched once before the threads use it
+        assets = self._get_assets()
+
+        if uids is None:
+            uids = list(assets)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(self._sync_form, uid, **kwargs): uid for uid in uids
+            }
+            try:
+                for future in as_completed(futures):
+                    uid = futures[future]
+                    try:
+                        yield SyncResult(uid, future.result(), None)
+                    except Exception as e:
+                        logging.error(f"Unable to sync the form {uid}: {e}")
+                        yield SyncResult(uid, None, e)
+            finally:
+                # If the caller stops before the end, the forms not started are cancelled
+                for future in futures:
+                    future.cancel()
+
+    def _sync_form(self, uid: str, **kwargs) -> KoboForm:
+        kform = self.get_form(uid)
+        if kform is None:
+            raise ValueError(f"There is no form with the uid: {uid}.")
+
+        kform.fetch_data(**kwargs)
+        if kform.data is None:
+            raise requests.HTTPError(f"Unable to fetch the data of the form {uid}.")
+
+        return kform
+
     def redeploy_form(self, uid: str) -> None:
         url = f"{self.url}/api/v{self.api_version}/assets/{uid}/deployment/?format=json"
-        requests.patch(url=url, headers=self.headers)
+        self.session.patch(url=url, headers=self.headers)
 
     def upload_media_from_local(
         self, uid: str, folder_path: str, file_name: str, rewrite: bool = False
@@ -127,7 +269,7 @@ class Manager:
             "file_type": "form_media",
         }
 
-        res = requests.get(f"{url_media}.json", headers=self.headers)
+        res = self.session.get(f"{url_media}.json", headers=self.headers)
         res.raise_for_status()
         dict_response = res.json()["results"]
 
@@ -137,7 +279,7 @@ class Manager:
                     del_id = each["uid"]
                     res.status_code = 403
                     while res.status_code != 204:
-                        res = requests.delete(
+                        res = self.session.delete(
                             f"{url_media}/{del_id}", headers=self.headers
                         )
                         time.sleep(1)
@@ -149,7 +291,7 @@ class Manager:
 
         files = {"content": (file_name, media_data)}  # Pass media_data directly
 
-        res = requests.post(
+        res = self.session.post(
             url=f"{url_media}.json", data=data, files=files, headers=self.headers
         )
         res.raise_for_status()
@@ -197,7 +339,7 @@ class Manager:
         }
 
         url = f"{self.url}/api/v{self.api_version}/assets/{uid}/permission-assignments.json"
-        res = requests.post(url=url, headers=self.headers, data=data)
+        res = self.session.post(url=url, headers=self.headers, data=data)
 
         if res.status_code != 201:
             raise requests.HTTPError(res.text)
@@ -209,7 +351,7 @@ class Manager:
         url_permissions = (
             f"{self.url}/api/v{self.api_version}/assets/{uid}/permission-assignments/"
         )
-        res = requests.get(url=url_permissions, headers=self.headers)
+        res = self.session.get(url=url_permissions, headers=self.headers)
 
         if res.status_code != 200:
             raise requests.HTTPError(f"Failed to fetch permissions: {res.text}")
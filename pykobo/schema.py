@@ -0,0 +1,142 @@
+import json
+import os
+import threading
+from typing import Union
+
+from .features import Question
+
+# Version of the format of the schemas saved to JSON. The files in another format
+# are ignored (and replaced) so they are compiled again from the asset
+SCHEMA_FORMAT = 3
+
+
+class SchemaCache:
+    """
+    Cache of the structures of the forms (questions, repeat groups and choices), compiled
+    from the content of their asset, by uid and version of the form. The structures are kept
+    in memory and, if a `directory` is given, on disk as JSON files (`schema-<uid>-<version>.json`)
+    so they are also reused by the next processes.
+
+    A schema is a dict with the keys `root_structure` and `geo` (lists of `Question`),
+    `repeats_structure` (same as `KoboForm.__repeats_structure`), `has_geo`, `has_repeats`
+    and `naming_conflicts`. The cached schemas must not be modified.
+    """
+
+    def __init__(self) -> None:
+        self._schemas = {}
+        self._lock = threading.Lock()
+
+    def get(
+        self, uid: str, version_id: str, directory: str = None
+    ) -> Union[dict, None]:
+        """Return the schema of the version `version_id` of the form `uid`
+        (`None` if it hasn't been compiled yet)."""
+        schema = self._schemas.get((uid, version_id))
+        if schema is not None or directory is None:
+            return schema
+
+        try:
+            with open(self._path(uid, version_id, directory)) as f:
+                schema = from_json(json.load(f))
+        except (FileNotFoundError, ValueError, KeyError):
+            return None
+
+        with self._lock:
+            return self._schemas.setdefault((uid, version_id), schema)
+
+    def set(
+        self, uid: str, version_id: str, schema: dict, directory: str = None
+    ) -> None:
+        with self._lock:
+            self._schemas[(uid, version_id)] = schema
+
+        if directory is not None:
+            path = self._path(uid, version_id, directory)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(to_json(schema), f)
+            os.replace(tmp, path)
+
+    def clear(self) -> None:
+        """Forget the schemas kept in memory."""
+        with self._lock:
+            self._schemas.clear()
+
+    @staticmethod
+    def _path(uid: str, version_id: str, directory: str) -> str:
+        return os.path.join(directory, f"schema-{uid}-{version_id}.json")
+
+
+def to_json(schema: dict) -> dict:
+    """Convert a schema to a dict which can be serialized to JSON. The lists of choices
+    are stored once by list name."""
+    questions = list(schema["root_structure"])
+    for repeat in schema["repeats_structure"].values():
+        questions += repeat["columns"]
+
+    choices = {
+        q.select_from_list_name: q.choices
+        for q in questions
+        if q.select_from_list_name is not None and q.choices is not None
+    }
+
+    return {
+        "format": SCHEMA_FORMAT,
+        "root_structure": [q.to_dict() for q in schema["root_structure"]],
+        "geo": [q.name for q in schema["geo"]],
+        "repeats_structure": {
+            k: {
+                "columns": [q.to_dict() for q in repeat["columns"]],
+                "has_geo": repeat["has_geo"],
+                "geo": [q.name for q in repeat["geo"]],
+                "parent": repeat["parent"],
+            }
+            for k, repeat in schema["repeats_structure"].items()
+        },
+        "choices": choices,
+        "has_geo": schema["has_geo"],
+        "has_repeats": schema["has_repeats"],
+        "naming_conflicts": schema["naming_conflicts"],
+    }
+
+
+def from_json(content: dict) -> dict:
+    """Build a schema from the result of `to_json`."""
+    if content.get("format") != SCHEMA_FORMAT:
+        raise ValueError(f"The format of the schema isn't {SCHEMA_FORMAT}.")
+
+    choices = content["choices"]
+
+    def load(questions: list) -> list:
+        questions = [Question.from_dict(q) for q in questions]
+        for q in questions:
+            # The questions using the same list share it, as when compiled from the asset
+            q.choices = choices.get(q.select_from_list_name)
+        return questions
+
+    def geo(questions: list, names: list) -> list:
+        return [q for q in questions if q.name in names]
+
+    root_structure = load(content["root_structure"])
+    repeats_structure = {}
+    for k, repeat in content["repeats_structure"].items():
+        columns = load(repeat["columns"])
+        repeats_structure[k] = {
+            "columns": columns,
+            "has_geo": repeat["has_geo"],
+            "geo": geo(columns, repeat["geo"]),
+            "parent": repeat["parent"],
+        }
+
+    return {
+        "root_structure": root_structure,
+        "geo": geo(root_structure, content["geo"]),
+        "repeats_structure": repeats_structure,
+        "has_geo": content["has_geo"],
+        "has_repeats": content["has_repeats"],
+        "naming_conflicts": content["naming_conflicts"],
+    }
+
+
+# Schemas shared by all the forms of the process
+SCHEMAS = SchemaCache()
@@ -0,0 +1,77 @@
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# HTTP status codes for which a request is retried: too many requests
+# and the transient errors of the server or of a proxy in front of it
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """
+    `HTTPAdapter` sending at most `rate_limit` requests per second to each host,
+    whatever the number of threads sharing it. The requests over the limit wait
+    for their turn.
+    """
+
+    def __init__(self, rate_limit: float, **kwargs) -> None:
+        self.rate_limit = rate_limit
+        self._next_request = {}
+        self._lock = threading.Lock()
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        host = urlparse(request.url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_request.get(host, now))
+            self._next_request[host] = slot + 1 / self.rate_limit
+
+        if slot > now:
+            time.sleep(slot - now)
+
+        return super().send(request, **kwargs)
+
+
+def create_session(
+    pool_size: int = 10,
+    max_retries: int = 3,
+    backoff_factor: float = 0.5,
+    rate_limit: float = None,
+) -> requests.Session:
+    """
+    Create a `requests.Session` keeping up to `pool_size` connections alive per host.
+    Idempotent requests (GET, DELETE...) failing with one of the status codes in
+    `RETRY_STATUS_CODES` or because of a connection error are retried up to `max_retries`
+    times, waiting `backoff_factor * 2 ** (retry - 1)` seconds between two retries
+    (or the time asked by the server with the header `Retry-After`).
+    If `rate_limit` is given, at most `rate_limit` requests per second are sent to each host.
+    """
+
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUS_CODES,
+        # Return the last response instead of raising an exception so the
+        # status code can be checked as for any other response
+        raise_on_status=False,
+    )
+    kwargs = {
+        "pool_connections": pool_size,
+        "pool_maxsize": pool_size,
+        "max_retries": retry,
+    }
+    if rate_limit is not None:
+        adapter = RateLimitedAdapter(rate_limit, **kwargs)
+    else:
+        adapter = HTTPAdapter(**kwargs)
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    return session
@@ -33,18 +33,29 @@ def capitalize_column_values(df: pd.DataFrame, column: str) -> None:
 
 def trim_columns_values(df: pd.DataFrame) -> pd.DataFrame:
     """
-    Trim whitespace from ends of each value across all series in dataframe
-    Source: https://stackoverflow.com/questions/40950310/strip-trim-all-strings-of-a-dataframe
+    Trim whitespace, then dots, from ends of each value across all series in dataframe
+    Only the columns of strings are processed, with the `.str` accessor, and the values
+    which are not strings are kept as they are
     """
 
-    def trim_ws(x):
-        return x.strip() if isinstance(x, str) else x
+    df = df.copy()
+    for column in df.columns:
+        df[column] = _trim(df[column])
 
-    def trim_pt(x):
-        return x.strip(".") if isinstance(x, str) else x
+    return df
 
-    df_temp = df.applymap(trim_ws)
-    return df_temp.applymap(trim_pt)
+
+def _trim(s: pd.Series) -> pd.Series:
+    if not (s.dtype == object or isinstance(s.dtype, pd.StringDtype)):
+        return s
+
+    try:
+        trimmed = s.str.strip().str.strip(".")
+    except AttributeError:
+        # Column of objects without any string
+        return s
+    # The values which are not strings are NaN after `.str`
+    return trimmed.where(trimmed.notna(), s)
 
 
 def reconcile_columns(
@@ -58,26 +69,21 @@ def reconcile_columns(
     Then delete columns `col1` and `col2`
     """
 
-    # `_temp` is a temporary name for `new_column`
-
     if pd.isna(criteria):
-        df.loc[(df[col1].isnull()), "_temp"] = df[col2]
-
-        df.loc[(df[col1].notnull()), "_temp"] = df[col1]
+        keep = df[col1].notnull()
     elif type(criteria) == str:
-        df.loc[(df[col1] == criteria), "_temp"] = df[col2]
-
-        df.loc[(df[col1] != criteria), "_temp"] = df[col1]
+        keep = df[col1] != criteria
     else:
         raise TypeError(
             f"The argument `criteria` is of type: `{type(criteria)}`. It should be of type `<class 'str'>` or equal to `NaN`"
         )
 
+    reconciled = df[col1].where(keep, df[col2])
+
     # Delete the 2 columns
     df.drop(columns=[col1, col2], inplace=True)
 
-    # Rename column `_temp` to `new_column`
-    df.rename(columns={"_temp": new_column}, inplace=True)
+    df[new_column] = reconciled
 
 
 def reconcile_columns_append(
@@ -94,21 +100,42 @@ def reconcile_columns_append(
         df[col1] = df[col1].astype(str)
 
     selection = df[col1].str.contains(to_replace, na=False)
-    for index, row in df.loc[selection].iterrows():
-        df.loc[index, col1] = row[col1].replace(to_replace, row[col2])
+    # The replacement is different for each row, so only the selected rows are
+    # processed and written back at once
+    df.loc[selection, col1] = [
+        value.replace(to_replace, replacement)
+        for value, replacement in zip(df.loc[selection, col1], df.loc[selection, col2])
+    ]
 
-    df["_temp"] = df[col1]
+    reconciled = df[col1]
 
     # Delete the 2 columns
     df.drop(columns=[col1, col2], inplace=True)
 
-    # Rename column `_temp` to `new_column`
-    df.rename(columns={"_temp": new_column}, inplace=True)
+    df[new_column] = reconciled
 
 
 def fix_typos(df: pd.DataFrame, column: str, typos: list) -> None:
-    for typo in typos:
-        df.loc[df[column] == typo[0], column] = typo[1]
+    """
+    Replace the values of the column 'column' given a list of pairs (typo, correction).
+    The pairs are applied in order, as if one after the other, with a single `replace`
+    """
+    df[column] = df[column].replace(_typos_mapping(typos))
+
+
+def _typos_mapping(typos: list) -> dict:
+    """
+    Merge the pairs (typo, correction) into a single mapping giving the same result
+    as replacing the pairs one after the other (e.g. [('a', 'b'), ('b', 'c')] gives
+    {'a': 'c', 'b': 'c'})
+    """
+    mapping = {}
+    for typo, correction in typos:
+        for k, v in mapping.items():
+            if v == typo:
+                mapping[k] = correction
+        mapping.setdefault(typo, correction)
+    return mapping
 
 
 def fillna(df: pd.DataFrame, column: str) -> None:
@@ -117,3 +144,86 @@ def fillna(df: pd.DataFrame, column: str) -> None:
 
 def convert_toint(df: pd.DataFrame, column) -> None:
     df[column] = df[column].astype(int)
+
+
+# Operations of a cleaning spec applied to each column, in this order
+COLUMN_OPERATIONS = ["trim", "lowercase", "capitalize", "typos", "fillna", "toint"]
+
+# Operations of a cleaning spec applied to the DataFrame, after the ones on the columns
+FRAME_OPERATIONS = [
+    "reconcile",
+    "reconcile_append",
+    "lowercase_columns_name",
+    "columns",
+]
+
+
+def clean(df: pd.DataFrame, spec: dict) -> pd.DataFrame:
+    """
+    Apply a cleaning spec to a copy of the DataFrame 'df' and return it. Each column is
+    read and written only once, whatever the number of operations applied to it.
+
+    The spec is a dict whose keys are the operations to apply:
+        'trim': True (all the columns) or a list of columns, see `trim_columns_values`
+        'lowercase': list of columns, see `lowercase_column_values`
+        'capitalize': list of columns, see `capitalize_column_values`
+        'typos': dict {column: [(typo, correction), ...]}, see `fix_typos`
+        'fillna': list of columns, see `fillna`
+        'toint': list of columns, see `convert_toint`
+        'reconcile': list of dicts of arguments of `reconcile_columns`
+        'reconcile_append': list of dicts of arguments of `reconcile_columns_append`
+        'lowercase_columns_name': True, see `lowercase_columns_name`
+        'columns': list of columns to keep, see `clean_df`
+    The operations on the columns are applied in the order above, then the ones on the DataFrame
+    """
+
+    for operation in spec:
+        if operation not in COLUMN_OPERATIONS + FRAME_OPERATIONS:
+            raise ValueError(
+                f"'{operation}' is not an accepted operation. Accepted operations are {COLUMN_OPERATIONS + FRAME_OPERATIONS}."
+            )
+
+    trim = spec.get("trim", False)
+    if trim is True:
+        trim = list(df.columns)
+    elif trim is False:
+        trim = []
+
+    # The operations to apply to each column
+    operations = {}
+    for operation in COLUMN_OPERATIONS:
+        columns = trim if operation == "trim" else spec.get(operation, [])
+        for column in columns:
+            operations.setdefault(column, []).append(operation)
+
+    df = df.copy()
+    for column, column_operations in operations.items():
+        s = df[column]
+        for operation in column_operations:
+            if operation == "trim":
+                s = _trim(s)
+            elif operation == "lowercase":
+                s = s.str.lower()
+            elif operation == "capitalize":
+                s = s.str.capitalize()
+            elif operation == "typos":
+                s = s.replace(_typos_mapping(spec["typos"][column]))
+            elif operation == "fillna":
+                s = s.fillna(0)
+            elif operation == "toint":
+                s = s.astype(int)
+        df[column] = s
+
+    for kwargs in spec.get("reconcile", []):
+        reconcile_columns(df, **kwargs)
+
+    for kwargs in spec.get("reconcile_append", []):
+        reconcile_columns_append(df, **kwargs)
+
+    if spec.get("lowercase_columns_name", False):
+        lowercase_columns_name(df)
+
+    if "columns" in spec:
+        df = clean_df(df, spec["columns"])
+
+    return df
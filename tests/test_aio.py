@@ -0,0 +1,220 @@
+import asyncio
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from pykobo.aio import AsyncKoboForm, AsyncManager
+from pykobo.schema import SCHEMAS
+
+httpx = pytest.importorskip("httpx")
+
+URL_KOBO = "https://kf.kobotoolbox.org"
+MYTOKEN = "2bc8e0201d23dac4ec1w309107698147b81517ax"
+
+with open("./tests/data_manager.json") as f:
+    data_manager = json.load(f)
+
+with open("./tests/data_asset.json") as f:
+    data_asset = json.load(f)
+
+
+def handler(request):
+    url = str(request.url)
+    if url.startswith(f"{URL_KOBO}/api/v2/assets.json"):
+        return httpx.Response(200, json={"results": [data_asset]})
+    if url == data_asset["url"]:
+        return httpx.Response(200, json=data_asset)
+    if url.startswith(data_asset["data"]):
+        start = int(request.url.params.get("start", 0))
+        submission = {"household/consent": "yes", "household/gps": "1 2 3 4"}
+        results = [dict(submission, _id=i + 1) for i in range(start, min(start + 2, 3))]
+        next_url = f"{data_asset['data']}?limit=2&start=2" if start == 0 else None
+        return httpx.Response(200, json={"next": next_url, "results": results})
+    return httpx.Response(404)
+
+
+def create_manager(transport) -> AsyncManager:
+    km = AsyncManager(url=URL_KOBO, api_version=2, token=MYTOKEN)
+    km.client = httpx.AsyncClient(transport=transport)
+    return km
+
+
+def test_wrong_api_version():
+    with pytest.raises(ValueError, match="The value of 'api_version' has to be: 2."):
+        AsyncManager(url=URL_KOBO, api_version=3, token=MYTOKEN)
+
+
+def test_fetch_forms():
+    async def run():
+        km = create_manager(
+            httpx.MockTransport(
+                lambda request: httpx.Response(
+                    200, json={"results": data_manager["input"]["results"]}
+                )
+            )
+        )
+        async with km:
+            return await km._fetch_forms()
+
+    assert asyncio.run(run()) == data_manager["output"]["results"]
+
+
+def test_fetch_data():
+    async def run():
+        async with create_manager(httpx.MockTransport(handler)) as km:
+            forms = await km.get_forms()
+            await asyncio.gather(*[f.fetch_data() for f in forms])
+            return forms
+
+    forms = asyncio.run(run())
+
+    assert isinstance(forms[0], AsyncKoboForm)
+    assert list(forms[0].data["_id"]) == [1, 2, 3]
+    assert list(forms[0].data["consent"]) == ["yes"] * 3
+
+
+def test_iter_batches():
+    async def run():
+        async with create_manager(httpx.MockTransport(handler)) as km:
+            form = await km.get_form(data_asset["uid"])
+            return [data async for data, _ in form.iter_batches(batch_size=2)]
+
+    batches = asyncio.run(run())
+
+    assert [list(data["_id"]) for data in batches] == [[1, 2], [3]]
+    assert [list(data["_index"]) for data in batches] == [[1, 2], [3]]
+
+
+def test_fetch_new_data():
+    params = []
+
+    def record(request):
+        params.append(dict(request.url.params))
+        return handler(request)
+
+    async def run():
+        async with create_manager(httpx.MockTransport(record)) as km:
+            form = await km.get_form(data_asset["uid"])
+            await form.fetch_data()
+            return form, await form.fetch_new_data(since=2, watermark="_id")
+
+    form, watermark = asyncio.run(run())
+
+    assert json.loads(params[-2]["query"]) == {"_id": {"$gt": 2}}
+    assert watermark == 3
+    assert list(form.data["_id"]) == [1, 2, 3]
+
+
+def test_schema_cached():
+    SCHEMAS.clear()
+    listing = {k: v for k, v in data_asset.items() if k != "content"}
+    urls = []
+
+    def record(request):
+        urls.append(str(request.url))
+        if str(request.url).startswith(f"{URL_KOBO}/api/v2/assets.json"):
+            return httpx.Response(200, json={"results": [listing]})
+        return handler(request)
+
+    async def run():
+        async with create_manager(httpx.MockTransport(record)) as km:
+            for _ in range(2):
+                km.invalidate_forms()
+                form = await km.get_form(data_asset["uid"])
+                await form.fetch_data()
+                [batch async for batch in form.iter_batches(batch_size=2)]
+                await form.fetch_new_data(since=2, watermark="_id")
+            return form
+
+    form = asyncio.run(run())
+
+    # The asset is fetched by the first form only, the second one uses its schema
+    assert urls.count(data_asset["url"]) == 1
+    assert list(form.data["consent"]) == ["yes"] * 3
+
+
+def test_download_attachments(tmp_path):
+    files = {f"https://kobo/{i}.jpg": bytes([i]) * 100 for i in (1, 2, 3)}
+    ranges = []
+
+    def files_handler(request):
+        content = files[str(request.url)]
+        if "Range" not in request.headers:
+            return httpx.Response(200, content=content)
+        start = int(request.headers["Range"][len("bytes=") : -1])  # noqa: E203
+        ranges.append(start)
+        if start >= len(content):
+            headers = {"Content-Range": f"bytes */{len(content)}"}
+            return httpx.Response(416, headers=headers)
+        return httpx.Response(206, content=content[start:])
+
+    form = AsyncKoboForm(
+        data_asset["uid"],
+        client=httpx.AsyncClient(transport=httpx.MockTransport(files_handler)),
+    )
+    form.data = pd.DataFrame(
+        {
+            "_id": [1, 2, 3],
+            "_index": [1, 2, 3],
+            "_attachments": [
+                [{"filename": "a/photo.jpg", "download_url": f"https://kobo/{i}.jpg"}]
+                for i in (1, 2, 3)
+            ],
+        }
+    )
+    # An interrupted download and a complete one not renamed
+    for _id, size in [(2, 40), (3, 100)]:
+        os.makedirs(tmp_path / str(_id))
+        with open(tmp_path / str(_id) / "photo.jpg.part", "wb") as f:
+            f.write(bytes([_id]) * size)
+
+    manifest = asyncio.run(form.download_attachments(str(tmp_path), chunk_size=30))
+
+    assert list(manifest["status"]) == ["downloaded", "resumed", "resumed"]
+    assert list(manifest["size"]) == [100, 100, 100]
+    assert sorted(ranges) == [40, 100]
+    for _id in (1, 2, 3):
+        with open(tmp_path / str(_id) / "photo.jpg", "rb") as f:
+            assert f.read() == files[f"https://kobo/{_id}.jpg"]
+
+    manifest = asyncio.run(form.download_attachments(str(tmp_path)))
+    assert list(manifest["status"]) == ["skipped"] * 3
+
+
+def test_retry():
+    calls = []
+
+    def flaky(request):
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(502)
+        return httpx.Response(200, json={"results": []})
+
+    async def run():
+        async with create_manager(httpx.MockTransport(flaky)) as km:
+            km.backoff_factor = 0
+            return await km._fetch_forms()
+
+    assert asyncio.run(run()) == []
+    assert len(calls) == 2
+
+
+def test_get_forms_error_not_cached():
+    calls = []
+
+    def failing_once(request):
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(403)
+        return httpx.Response(200, json={"results": [data_asset]})
+
+    async def run():
+        async with create_manager(httpx.MockTransport(failing_once)) as km:
+            return await km.get_forms(), await km.get_forms(), await km.get_forms()
+
+    first, second, third = asyncio.run(run())
+    assert first == []
+    assert [f.uid for f in second] == [f.uid for f in third] == [data_asset["uid"]]
+    assert len(calls) == 2
@@ -0,0 +1,27 @@
+from benchmarks.mock_server import MockKoboServer, SyntheticForm
+from benchmarks.run import main
+from pykobo import Manager
+
+
+def test_mock_server():
+    form = SyntheticForm("form0", nb_rows=5, repeat_depth=2, nb_attachments=1)
+    with MockKoboServer([form]) as server:
+        km = Manager(url=server.url, api_version=2, token="benchmark")
+        kform = km.get_form("form0")
+        kform.fetch_data(page_size=2)
+        kform.fetch_attachments(["photo"])
+
+        assert len(kform.data) == 5
+        assert len(kform.repeats["repeat_2"]) == 20
+        assert kform.data["media_photo"][0] == f"{server.url}/media/form0/photo_0_0.jpg"
+        assert server.counts == {"assets": 1, "asset": 1, "data": 3}
+
+
+def test_benchmarks(tmp_path):
+    results = main(
+        ["--forms", "2", "--rows", "10", "--repeat", "1"]
+        + ["--output", str(tmp_path / "results.json")]
+    )
+
+    assert results["KoboForm.fetch_data"]["requests"] == 2
+    assert (tmp_path / "results.json").exists()
@@ -0,0 +1,98 @@
+import json
+import os
+
+from pykobo.cache import ResponseCache, cached_get
+
+
+class MockResponse:
+    def __init__(self, body, status_code=200, headers=None):
+        self.content = json.dumps(body).encode()
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class MockSession:
+    """Answer 304 when the ETag sent matches the one of the body"""
+
+    def __init__(self, body, etag):
+        self.body = body
+        self.etag = etag
+        self.calls = []
+
+    def get(self, url, headers=None, params=None):
+        self.calls.append(headers)
+        if headers.get("If-None-Match") == self.etag:
+            return MockResponse(None, 304)
+        return MockResponse(self.body, 200, {"ETag": self.etag})
+
+
+def test_key():
+    key = ResponseCache.key("uid", "v1", "https://kobo/data.json", {"limit": 10})
+    assert key == ResponseCache.key(
+        "uid", "v1", "https://kobo/data.json", {"limit": 10}
+    )
+    assert key != ResponseCache.key(
+        "uid", "v2", "https://kobo/data.json", {"limit": 10}
+    )
+
+
+def test_cached_get(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    session = MockSession({"results": [1, 2]}, '"abc"')
+    headers = {"Authorization": "Token 123"}
+
+    res = cached_get(session, cache, "key", "https://kobo/data.json", headers)
+    assert res.json() == {"results": [1, 2]}
+    assert "If-None-Match" not in session.calls[0]
+
+    res = cached_get(session, cache, "key", "https://kobo/data.json", headers)
+    assert session.calls[1]["If-None-Match"] == '"abc"'
+    assert res.status_code == 200
+    assert res.json() == {"results": [1, 2]}
+    # The headers given are not modified
+    assert headers == {"Authorization": "Token 123"}
+
+    # The content changed on the server
+    session.body, session.etag = {"results": [3]}, '"def"'
+    res = cached_get(session, cache, "key", "https://kobo/data.json", headers)
+    assert res.json() == {"results": [3]}
+    assert cache.get("key")["body"] == b'{"results": [3]}'
+
+
+def test_eviction(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_size=250)
+    for i in range(3):
+        cache.set(f"key{i}", '"etag"', None, b"x" * 100)
+        # Make sure the files have different modification times
+        for path in cache._paths(f"key{i}"):
+            os.utime(path, (i, i))
+
+    assert cache.get("key0") is None
+    assert cache.get("key1") is None
+    assert cache.get("key2")["body"] == b"x" * 100
+
+    cache.clear()
+    assert cache.get("key2") is None
+
+
+def test_eviction_running_size(tmp_path, monkeypatch):
+    cache = ResponseCache(str(tmp_path), max_size=1000)
+    scans = []
+    scan = cache._scan
+    monkeypatch.setattr(cache, "_scan", lambda: scans.append(1) or scan())
+
+    # The directory is scanned once to know its size, then only when the cache is full
+    for i in range(5):
+        cache.set(f"key{i}", '"etag"', None, b"x" * 100)
+    cache.set("key0", '"etag"', None, b"x" * 50)
+    assert len(scans) == 1
+    assert cache._size == sum(e.stat().st_size for e in os.scandir(tmp_path))
+
+    for i in range(5, 10):
+        cache.set(f"key{i}", '"etag"', None, b"x" * 100)
+    assert len(scans) > 1
+    assert cache._size <= 1000
+    assert cache._size == sum(e.stat().st_size for e in os.scandir(tmp_path))
@@ -1,6 +1,16 @@
+import copy
+import io
 import json
+import os
+from urllib.parse import parse_qsl, urlencode
 
+import pandas as pd
+import pytest
+import requests
+
+from pykobo.cache import ResponseCache
 from pykobo.form import KoboForm
+from pykobo.schema import SCHEMAS
 
 uid = "cSatm9oFcA3e9dwJdHUrBZ"
 kform = KoboForm(uid=uid)
@@ -29,3 +39,913 @@ def test_extract_from_asset():
     assert kform.url_asset == data_form["url"]
     assert kform.url_data == data_form["data"]
     assert kform.base_url == "https://kf.kobotoolbox.org/api/v2/assets"
+
+
+with open("./tests/data_asset.json") as f:
+    data_asset = json.load(f)
+
+
+@pytest.fixture(autouse=True)
+def clear_schemas():
+    # Some tests use different contents for the same version of the form
+    SCHEMAS.clear()
+
+
+def make_submissions(n: int) -> list:
+    submissions = []
+    for i in range(n):
+        submission = {
+            "_id": i + 1,
+            "start": "2022-12-05T14:36:19.800+01:00",
+            "household/age_hhh": str(30 + i),
+            "household/consent": "yes" if i % 2 == 0 else "no",
+            "household/assets": "radio phone",
+            "household/gps": f"{i}.5 -{i}.25 100 5",
+            "_submission_time": f"2022-12-{i + 1:02d}T10:00:00",
+            "_attachments": [],
+        }
+        if i % 2 == 1:
+            submission["children_count"] = "2"
+            submission["children"] = [
+                {"children/child_name": f"child {i}a", "children/school": "yes"},
+                {"children/child_name": f"child {i}b", "children/school": "no"},
+            ]
+        submissions.append(submission)
+    return submissions
+
+
+class MockResponse:
+    def __init__(self, json_body, status_code=200):
+        self.json_body = json_body
+        self.status_code = status_code
+        self.headers = {}
+        self.raw = io.BytesIO(self.content)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.raw.close()
+
+    @property
+    def content(self):
+        return json.dumps(self.json_body).encode()
+
+    def json(self):
+        return self.json_body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error")
+
+
+def lookup(document: dict, path: str) -> list:
+    """The values of the field `path` of a MongoDB document (through the lists of children)"""
+    head, _, rest = path.partition(".")
+    value = document.get(head)
+    if not rest:
+        return [value]
+    children = value if isinstance(value, list) else []
+    return [v for child in children for v in lookup(child, rest)]
+
+
+OPERATORS = {
+    "$gt": lambda value, arg: value is not None and value > arg,
+    "$in": lambda value, arg: value in arg,
+}
+
+
+def matches(document: dict, query: dict) -> bool:
+    """Evaluate a query in the syntax of MongoDB (a few operators only)"""
+    for key, condition in query.items():
+        if key == "$and":
+            if not all(matches(document, q) for q in condition):
+                return False
+        elif key == "$or":
+            if not any(matches(document, q) for q in condition):
+                return False
+        elif isinstance(condition, dict):
+            if not any(
+                all(OPERATORS[op](v, arg) for op, arg in condition.items())
+                for v in lookup(document, key)
+            ):
+                return False
+        elif condition not in lookup(document, key):
+            return False
+    return True
+
+
+class MockServer:
+    """Mimic the pagination of the data endpoint of the Kobo API"""
+
+    def __init__(self, submissions: list, default_limit: int = 2) -> None:
+        self.submissions = submissions
+        self.default_limit = default_limit
+        self.calls = []
+
+    def get(self, url, headers=None, params=None, **kwargs):
+        self.calls.append((url, params))
+        if url == data_asset["url"]:
+            return MockResponse(data_asset)
+
+        url, _, query = url.partition("?")
+        params = dict(params or {})
+        params.update(parse_qsl(query))
+
+        submissions = self.submissions
+        if "query" in params:
+            query = json.loads(params["query"])
+            submissions = [s for s in submissions if matches(s, query)]
+
+        start = int(params.get("start", 0))
+        limit = int(params.get("limit", self.default_limit))
+        end = start + limit
+        results = submissions[start:end]
+        if "fields" in params:
+            fields = json.loads(params["fields"])
+            results = [{k: v for k, v in s.items() if k in fields} for s in results]
+        next_url = None
+        if end < len(submissions):
+            params.update({"start": end, "limit": limit})
+            next_url = f"{url}?{urlencode(params)}"
+
+        return MockResponse(
+            {"count": len(submissions), "next": next_url, "results": results}
+        )
+
+
+def create_form(monkeypatch, server: MockServer) -> KoboForm:
+    form = KoboForm(uid=data_asset["uid"])
+    monkeypatch.setattr(form.session, "get", server.get)
+    form._extract_from_asset(data_asset)
+    return form
+
+
+def test_fetch_data_follows_next(monkeypatch):
+    server = MockServer(make_submissions(5))
+    form = create_form(monkeypatch, server)
+    form.fetch_data()
+
+    assert len(form.data) == 5
+    assert list(form.data["_index"]) == [1, 2, 3, 4, 5]
+    assert list(form.data["_id"]) == [1, 2, 3, 4, 5]
+    # 1 call for the asset + 3 pages of 2 submissions
+    assert len(server.calls) == 4
+
+
+def test_fetch_data_page_size(monkeypatch):
+    server = MockServer(make_submissions(5))
+    form = create_form(monkeypatch, server)
+    form.fetch_data(page_size=4)
+
+    assert server.calls[1][1] == {"start": 0, "limit": 4}
+    assert len(server.calls) == 3
+    assert len(form.data) == 5
+
+    children = form.repeats["children"]
+    assert len(children) == 4
+    assert list(children["_parent_index"]) == [2, 2, 4, 4]
+    assert "children" not in form.data.columns
+    assert "children_count" not in form.data.columns
+
+
+def test_fetch_data_page_size_invalid(monkeypatch):
+    form = create_form(monkeypatch, MockServer(make_submissions(1)))
+    with pytest.raises(ValueError, match="'page_size' has to be greater than 0"):
+        form.fetch_data(page_size=0)
+
+
+def test_fetch_data_fail(monkeypatch):
+    server = MockServer(make_submissions(5))
+    form = create_form(monkeypatch, server)
+
+    def get(url, **kwargs):
+        if url == data_asset["url"]:
+            return MockResponse(data_asset)
+        return MockResponse({}, 500)
+
+    monkeypatch.setattr(form.session, "get", get)
+
+    assert form.fetch_data().empty
+
+
+def test_compact_schema(monkeypatch):
+    server = MockServer(make_submissions(2))
+    form = create_form(monkeypatch, server)
+    form.fetch_data()
+
+    # The asset is dropped once the structure is built and isn't fetched again
+    assert form._KoboForm__asset is None
+    form.fetch_data()
+    assert [url for url, _ in server.calls].count(data_asset["url"]) == 1
+
+    structure = form._KoboForm__root_structure
+    assert not hasattr(structure[0], "__dict__")
+    consent = [q for q in structure if q.name == "consent"][0]
+    school = form._KoboForm__repeats_structure["children"]["columns"][1]
+    assert consent.choices is school.choices
+
+
+def test_schema_cache(monkeypatch, tmp_path):
+    server = MockServer(make_submissions(4))
+    form = create_form(monkeypatch, server)
+    form.cache = ResponseCache(str(tmp_path))
+    form.fetch_data()
+    form.fetch_data()
+
+    # The structure is reused by the other forms with the same version, from memory
+    # and then from the disk, without fetching the asset
+    for clear in [False, True]:
+        if clear:
+            SCHEMAS.clear()
+        other = create_form(monkeypatch, server)
+        other.cache = ResponseCache(str(tmp_path))
+        other.fetch_data()
+        pd.testing.assert_frame_equal(other.data, form.data)
+        pd.testing.assert_frame_equal(
+            other.repeats["children"], form.repeats["children"]
+        )
+
+    assert [url for url, _ in server.calls].count(data_asset["url"]) == 1
+
+    structure = other._KoboForm__root_structure
+    assert [q.name for q in structure].count("consent") == 1
+    consent = [q for q in structure if q.name == "consent"][0]
+    school = other._KoboForm__repeats_structure["children"]["columns"][1]
+    assert consent.choices is school.choices
+
+
+def test_fetch_data_stream(monkeypatch):
+    pytest.importorskip("ijson")
+    server = MockServer(make_submissions(5))
+    form = create_form(monkeypatch, server)
+    form.fetch_data(stream=True, page_size=2)
+
+    assert len(server.calls) == 4
+    assert list(form.data["_id"]) == [1, 2, 3, 4, 5]
+    assert list(form.data["_index"]) == [1, 2, 3, 4, 5]
+    assert list(form.repeats["children"]["_parent_index"]) == [2, 2, 4, 4]
+
+    expected = create_form(monkeypatch, MockServer(make_submissions(5)))
+    expected.fetch_data()
+    pd.testing.assert_frame_equal(form.data, expected.data)
+
+
+def test_fetch_data_parallel(monkeypatch):
+    server = MockServer(make_submissions(5))
+    form = create_form(monkeypatch, server)
+    form.fetch_data(page_size=2, max_workers=3)
+
+    offsets = sorted(params["start"] for _, params in server.calls[1:])
+    assert offsets == [0, 2, 4]
+    assert list(form.data["_id"]) == [1, 2, 3, 4, 5]
+    assert list(form.repeats["children"]["_parent_index"]) == [2, 2, 4, 4]
+
+
+def test_fetch_data_parallel_new_submissions(monkeypatch):
+    # The form received 2 submissions since its metadata were fetched
+    server = MockServer(make_submissions(7))
+    form = create_form(monkeypatch, server)
+    form.fetch_data(page_size=2, max_workers=3)
+
+    assert list(form.data["_id"]) == [1, 2, 3, 4, 5, 6, 7]
+
+
+def test_fetch_new_data(monkeypatch):
+    server = MockServer(make_submissions(4))
+    form = create_form(monkeypatch, server)
+    form.fetch_data()
+    form.display(columns_as="label", choices_as="label")
+
+    # 2 new submissions and an edited one
+    submissions = make_submissions(6)
+    submissions[3]["_submission_time"] = "2022-12-10T10:00:00"
+    submissions[3]["household/consent"] = "yes"
+    server.submissions = submissions
+
+    watermark = form.fetch_new_data(since="2022-12-04T10:00:00")
+
+    assert json.loads(server.calls[3][1]["query"]) == {
+        "_submission_time": {"$gt": "2022-12-04T10:00:00"}
+    }
+    assert watermark == "2022-12-10T10:00:00"
+    assert list(form.data["_id"]) == [1, 2, 3, 4, 5, 6]
+    assert list(form.data["_index"]) == [1, 2, 3, 4, 5, 6]
+    assert list(form.data["Consent obtained"]) == [
+        "Yes",
+        "No",
+        "Yes",
+        "Yes",
+        "Yes",
+        "No",
+    ]
+    assert list(form.data["Assets"]) == ["Radio|Phone"] * 6
+
+    children = form.repeats["children"]
+    assert list(children["_parent_index"]) == [2, 2, 4, 4, 6, 6]
+    assert list(children["Going to school?"]) == ["Yes", "No"] * 3
+
+    # No new submissions
+    assert form.fetch_new_data(since=watermark) == watermark
+    assert len(form.data) == 6
+
+
+def test_fetch_new_data_id(monkeypatch):
+    server = MockServer(make_submissions(5))
+    form = create_form(monkeypatch, server)
+
+    assert form.fetch_new_data(since=3, watermark="_id") == 5
+    assert list(form.data["_id"]) == [4, 5]
+
+    with pytest.raises(ValueError, match="'_uuid' is not an accepted value"):
+        form.fetch_new_data(since=3, watermark="_uuid")
+
+
+def test_fetch_data_fields(monkeypatch):
+    server = MockServer(make_submissions(4))
+    form = create_form(monkeypatch, server)
+    form.fetch_data(fields=["Consent obtained", "gps", "child_name", "_uuid"])
+
+    assert json.loads(server.calls[1][1]["fields"]) == [
+        "_id",
+        "_submission_time",
+        "household/consent",
+        "household/gps",
+        "children",
+        "_uuid",
+    ]
+    assert list(form.data.columns) == [
+        "consent",
+        "gps",
+        "_gps_latitude",
+        "_gps_longitude",
+        "_gps_altitude",
+        "_gps_precision",
+        "_id",
+        "_submission_time",
+        "_index",
+    ]
+    assert list(form.repeats) == ["children"]
+    assert list(form.repeats["children"].columns) == [
+        "child_name",
+        "_index",
+        "_parent_index",
+    ]
+
+    # The new submissions are fetched with the same columns
+    form.fetch_new_data(since=2, watermark="_id")
+    assert "fields" in server.calls[-1][1]
+    assert "age_hhh" not in form.data.columns
+
+    form.fetch_data(fields=["household"])
+    assert list(form.data.columns[:4]) == ["age_hhh", "consent", "assets", "gps"]
+    assert form.repeats == {}
+
+    # The groups and the repeat groups are also selected by their label
+    server.calls.clear()
+    form.fetch_data(fields=["Household", "Children"])
+    assert json.loads(server.calls[0][1]["fields"])[2:] == [
+        "household/age_hhh",
+        "household/consent",
+        "household/assets",
+        "household/gps",
+        "children",
+    ]
+    assert list(form.repeats["children"].columns) == [
+        "child_name",
+        "school",
+        "_index",
+        "_parent_index",
+    ]
+
+    with pytest.raises(ValueError, match="'unknown' is not the name"):
+        form.fetch_data(fields=["unknown"])
+
+
+def test_fetch_data_fields_nested_repeats(monkeypatch):
+    monkeypatch.setitem(globals(), "data_asset", nested_asset())
+    server = MockServer(make_nested_submissions(4))
+    form = create_form(monkeypatch, server)
+    form.fetch_data(fields=["toy"])
+
+    assert json.loads(server.calls[1][1]["fields"])[2:] == ["children"]
+    # The repeat group containing the selected one is kept to join it to the data
+    assert list(form.repeats["children"].columns) == ["_index", "_parent_index"]
+    assert list(form.repeats["toys"].columns) == ["toy", "_index", "_parent_index"]
+    assert list(form.repeats["toys"]["_parent_index"]) == [1, 1, 2, 2, 3, 3, 4, 4]
+
+
+def test_fetch_data_query(monkeypatch):
+    server = MockServer(make_submissions(6))
+    form = create_form(monkeypatch, server)
+    form.fetch_data(query={"$or": [{"Consent obtained": "no"}, {"_id": {"$in": [1]}}]})
+
+    assert json.loads(server.calls[1][1]["query"]) == {
+        "$or": [{"household/consent": "no"}, {"_id": {"$in": [1]}}]
+    }
+    assert list(form.data["_id"]) == [1, 2, 4, 6]
+
+    # A question of a repeat group matches the submissions with one child matching
+    form.fetch_data(query={"child_name": "child 3b"})
+    assert json.loads(server.calls[-1][1]["query"]) == {
+        "children.children/child_name": "child 3b"
+    }
+    assert list(form.data["_id"]) == [4]
+    assert len(form.repeats["children"]) == 2
+
+    # The number of pages is given by the number of submissions matching the filter
+    server.calls.clear()
+    form.fetch_data(page_size=1, max_workers=2, query={"consent": "no"})
+    assert list(form.data["_id"]) == [2, 4, 6]
+    assert len(server.calls) == 3
+
+    form.fetch_new_data(since=4, watermark="_id")
+    assert json.loads(server.calls[-1][1]["query"]) == {
+        "$and": [{"household/consent": "no"}, {"_id": {"$gt": 4}}]
+    }
+    assert list(form.data["_id"]) == [2, 4, 6]
+
+    with pytest.raises(ValueError, match="'unknown' is not the name"):
+        form.fetch_data(query={"unknown": "yes"})
+    with pytest.raises(ValueError, match="has to be a dict"):
+        form.fetch_data(query="consent == 'yes'")
+
+
+def test_display_choices(monkeypatch):
+    submissions = make_submissions(4)
+    submissions[0]["household/assets"] = "phone bike radio"
+    submissions[1]["household/assets"] = "phone unknown"
+    del submissions[2]["household/assets"]
+    del submissions[3]["household/consent"]
+    form = create_form(monkeypatch, MockServer(submissions))
+    form.fetch_data()
+
+    assets = ["radio|bike|phone", "phone", "", "radio|phone"]
+    assert list(form.data["assets"].fillna("")) == assets
+    assert list(form.data["consent"].fillna("")) == ["yes", "no", "yes", ""]
+
+    form.display(columns_as="label", choices_as="label")
+    assert list(form.data["Assets"].fillna("")) == [
+        "Radio|Bicycle|Phone",
+        "Phone",
+        "",
+        "Radio|Phone",
+    ]
+    assert list(form.data["Consent obtained"].fillna("")) == ["Yes", "No", "Yes", ""]
+    assert list(form.repeats["children"]["Going to school?"]) == ["Yes", "No"] * 2
+
+    form.display(columns_as="name", choices_as="name")
+    assert list(form.data["assets"].fillna("")) == assets
+    assert list(form.data["consent"].fillna("")) == ["yes", "no", "yes", ""]
+
+
+def test_fetch_data_categorical(monkeypatch):
+    submissions = make_submissions(3)
+    submissions[2]["household/consent"] = "maybe"
+    form = create_form(monkeypatch, MockServer(submissions))
+    form.fetch_data(categorical=True, one_hot=True)
+
+    consent = form.data["consent"]
+    assert consent.dtype == "category"
+    assert list(consent.cat.categories) == ["yes", "no", "maybe"]
+    assert list(consent) == ["yes", "no", "maybe"]
+    assert form.repeats["children"]["school"].dtype == "category"
+
+    one_hot = ["assets/radio", "assets/bike", "assets/phone"]
+    columns = list(form.data.columns)
+    position = columns.index("assets")
+    assert columns[position + 1 : position + 4] == one_hot  # noqa: E203
+    assert form.data[one_hot].dtypes.unique() == ["uint8"]
+    assert form.data[one_hot].values.tolist() == [[1, 0, 1]] * 3
+
+    form.display(columns_as="label", choices_as="label")
+    consent = form.data["Consent obtained"]
+    assert list(consent.cat.categories) == ["Yes", "No", "maybe"]
+    assert list(consent) == ["Yes", "No", "maybe"]
+    assert form.data["Assets/Bicycle"].tolist() == [0, 0, 0]
+
+
+def nested_asset() -> dict:
+    asset = copy.deepcopy(data_asset)
+    survey = asset["content"]["survey"]
+    position = [f["type"] for f in survey].index("end_repeat")
+    survey[position:position] = [
+        {"type": "begin_repeat", "name": "toys", "$autoname": "toys"},
+        {"type": "text", "name": "toy", "$autoname": "toy", "label": ["Toy"]},
+        {"type": "end_repeat"},
+    ]
+    return asset
+
+
+def make_nested_submissions(n: int) -> list:
+    submissions = make_submissions(n)
+    for submission in submissions:
+        for child in submission.get("children", []):
+            name = child["children/child_name"]
+            child["children/toys_count"] = "2"
+            child["children/toys"] = [
+                {"children/toys/toy": f"{name} toy 1"},
+                {"children/toys/toy": f"{name} toy 2"},
+            ]
+    return submissions
+
+
+def test_fetch_data_nested_repeats(monkeypatch):
+    submissions = make_nested_submissions(4)
+    raw = copy.deepcopy(submissions)
+    monkeypatch.setitem(globals(), "data_asset", nested_asset())
+    form = create_form(monkeypatch, MockServer(submissions))
+    form.fetch_data()
+
+    # The submissions received from the API are not modified
+    assert submissions == raw
+
+    children = form.repeats["children"]
+    assert list(children.columns) == ["child_name", "school", "_index", "_parent_index"]
+    assert list(children["_index"]) == [1, 2, 3, 4]
+    assert list(children["_parent_index"]) == [2, 2, 4, 4]
+
+    toys = form.repeats["toys"]
+    assert list(toys.columns) == ["toy", "_index", "_parent_index"]
+    assert list(toys["_index"]) == list(range(1, 9))
+    assert list(toys["_parent_index"]) == [1, 1, 2, 2, 3, 3, 4, 4]
+    assert toys["toy"][2] == "child 1b toy 1"
+
+
+def test_iter_batches(monkeypatch):
+    monkeypatch.setitem(globals(), "data_asset", nested_asset())
+    form = create_form(monkeypatch, MockServer(make_nested_submissions(5)))
+    form.fetch_data(categorical=True)
+
+    batches = list(form.iter_batches(batch_size=2, categorical=True))
+
+    # The batches aren't stored in the form
+    assert len(form.data) == 5
+    assert [len(data) for data, _ in batches] == [2, 2, 1]
+    assert list(batches[2][1]) == []
+
+    data = pd.concat([data for data, _ in batches], ignore_index=True)
+    pd.testing.assert_frame_equal(data, form.data)
+    for k in ["children", "toys"]:
+        v = pd.concat([r[k] for _, r in batches if k in r], ignore_index=True)
+        pd.testing.assert_frame_equal(v, form.repeats[k])
+
+
+def test_fetch_new_data_nested_repeats(monkeypatch):
+    monkeypatch.setitem(globals(), "data_asset", nested_asset())
+    server = MockServer(make_nested_submissions(4))
+    form = create_form(monkeypatch, server)
+    form.fetch_data()
+
+    submissions = make_nested_submissions(6)
+    # The submission 2 is edited and doesn't have children anymore
+    submissions[1]["_submission_time"] = "2022-12-10T10:00:00"
+    del submissions[1]["children"]
+    server.submissions = submissions
+
+    form.fetch_new_data(since="2022-12-04T10:00:00")
+
+    children = form.repeats["children"]
+    assert list(children["_index"]) == [3, 4, 5, 6]
+    assert list(children["_parent_index"]) == [4, 4, 6, 6]
+
+    toys = form.repeats["toys"]
+    assert list(toys["_parent_index"]) == [3, 3, 4, 4, 5, 5, 6, 6]
+    assert list(toys["toy"][-2:]) == ["child 5b toy 1", "child 5b toy 2"]
+
+
+def test_fetch_data_coerce_types(monkeypatch):
+    submissions = make_submissions(4)
+    submissions[1]["household/age_hhh"] = "unknown"
+    del submissions[2]["household/gps"]
+    submissions[3]["household/age_hhh"] = "33.5"
+    form = create_form(monkeypatch, MockServer(submissions))
+    form.fetch_data(coerce_types=True)
+
+    assert form.data["age_hhh"].dtype == "Int64"
+    assert form.data["age_hhh"].tolist() == [30, pd.NA, 32, pd.NA]
+    assert form.data["start"].dtype == "datetime64[ns, UTC]"
+    assert form.data["start"][0] == pd.Timestamp("2022-12-05T13:36:19.800Z")
+    assert form.data["_gps_latitude"].dtype == "float64"
+    assert form.data["_gps_longitude"].tolist()[:2] == [-0.25, -1.25]
+    assert pd.isna(form.data["_gps_altitude"][2])
+    # The columns of other types are not converted
+    assert form.data["gps"].dtype == "object"
+
+
+def test_fetch_data_pyarrow(monkeypatch):
+    pytest.importorskip("pyarrow")
+    server = MockServer(make_submissions(4))
+    form = create_form(monkeypatch, server)
+    form.fetch_data(dtype_backend="pyarrow")
+
+    assert form.data["age_hhh"].dtype == "string[pyarrow]"
+    assert form.data["assets"].dtype == "string[pyarrow]"
+    assert form.data["_gps_latitude"].dtype == "float64"
+    # The dates are converted even without coerce_types
+    assert form.data["start"].dtype == "datetime64[ns, UTC]"
+    assert list(form.data["consent"].cat.categories) == ["yes", "no"]
+    assert form.repeats["children"]["child_name"].dtype == "string[pyarrow]"
+
+    form.display(columns_as="label", choices_as="label")
+    assert form.data["Assets"].dtype == "string[pyarrow]"
+    assert form.data["Assets"][0] == "Radio|Phone"
+
+    server.submissions = make_submissions(5)
+    form.fetch_new_data(since="2022-12-04T10:00:00")
+    assert form.data["Assets"].dtype == "string[pyarrow]"
+    assert form.data["Assets"][4] == "Radio|Phone"
+    assert form.data["start"].dtype == "datetime64[ns, UTC]"
+
+    with pytest.raises(ValueError, match="'arrow' is not an accepted value"):
+        form.fetch_data(dtype_backend="arrow")
+
+
+def geo_asset() -> dict:
+    asset = copy.deepcopy(data_asset)
+    survey = asset["content"]["survey"]
+    position = [f["type"] for f in survey].index("end_repeat")
+    survey.insert(
+        position,
+        {"type": "geopoint", "name": "home", "$autoname": "home", "label": ["Home"]},
+    )
+    survey.append(
+        {"type": "geoshape", "name": "field", "$autoname": "field", "label": ["Field"]}
+    )
+    return asset
+
+
+def test_fetch_data_geo(monkeypatch):
+    submissions = make_submissions(4)
+    submissions[1]["children"][0]["children/home"] = "1.5 2.5 10 3"
+    submissions[0]["field"] = "0 0 0 0;0 1 0 0;1 1 0 0;0 0 0 0"
+    monkeypatch.setitem(globals(), "data_asset", geo_asset())
+    form = create_form(monkeypatch, MockServer(submissions))
+    form.fetch_data()
+
+    assert form.data["_gps_longitude"].tolist() == [-0.25, -1.25, -2.25, -3.25]
+    children = form.repeats["children"]
+    assert list(children.columns[2:7]) == [
+        "home",
+        "_home_latitude",
+        "_home_longitude",
+        "_home_altitude",
+        "_home_precision",
+    ]
+    assert children["_home_latitude"].dtype == "float64"
+    assert children["_home_latitude"][0] == 1.5
+    assert children["_home_latitude"][1:].isna().all()
+
+    pytest.importorskip("geopandas")
+    gdf = form.to_geodataframe()
+    assert gdf.crs == "EPSG:4326"
+    assert (gdf.geometry[0].x, gdf.geometry[0].y) == (-0.25, 0.5)
+    assert form.to_geodataframe("field").geometry[0].area == 0.5
+    assert form.to_geodataframe(repeat="children").geometry[0].x == 2.5
+
+    form.display(columns_as="label")
+    assert form.to_geodataframe("Field").geometry[0].area == 0.5
+    with pytest.raises(ValueError, match="named 'age_hhh'"):
+        form.to_geodataframe("age_hhh")
+
+
+def test_fetch_attachments(monkeypatch):
+    submissions = make_submissions(3)
+    submissions[0]["photo"] = "my photo.jpg"
+    submissions[0]["_attachments"] = [
+        {
+            "filename": "owner1/attachments/abc/my_photo.jpg",
+            "download_url": "https://kobo/my_photo.jpg",
+        },
+        {
+            "filename": "owner1/attachments/abc/sound.mp3",
+            "download_url": "https://kobo/sound.mp3",
+        },
+    ]
+    submissions[0]["audio"] = "sound.mp3"
+    submissions[1]["photo"] = "missing.jpg"
+    form = create_form(monkeypatch, MockServer(submissions))
+    form.fetch_data()
+    form.fetch_attachments(["photo", "audio"])
+
+    assert form.data["media_photo"][0] == "https://kobo/my_photo.jpg"
+    assert form.data["media_audio"][0] == "https://kobo/sound.mp3"
+    assert pd.isna(form.data["media_photo"][1])
+    assert form.data["media_audio"][1:].isna().all()
+
+
+def test_fetch_attachments_fields(monkeypatch):
+    asset = copy.deepcopy(data_asset)
+    asset["content"]["survey"].insert(
+        1, {"type": "image", "name": "photo", "$autoname": "photo", "label": ["Photo"]}
+    )
+    monkeypatch.setitem(globals(), "data_asset", asset)
+    submissions = make_submissions(2)
+    submissions[0]["photo"] = "my_photo.jpg"
+    submissions[0]["_attachments"] = [
+        {
+            "filename": "owner1/attachments/abc/my_photo.jpg",
+            "download_url": "https://kobo/my_photo.jpg",
+        }
+    ]
+    form = create_form(monkeypatch, MockServer(submissions))
+    form.fetch_data(fields=["photo"])
+    form.fetch_attachments(["photo"])
+
+    assert list(form.data.columns[:4]) == [
+        "photo",
+        "_id",
+        "_submission_time",
+        "_attachments",
+    ]
+    assert form.data["media_photo"][0] == "https://kobo/my_photo.jpg"
+    assert pd.isna(form.data["media_photo"][1])
+
+
+class MockFileResponse:
+    def __init__(self, content: bytes, status_code: int = 200):
+        self.content = content
+        self.status_code = status_code
+        self.headers = {"Content-Length": str(len(content))}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def close(self):
+        pass
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error")
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i : i + chunk_size]  # noqa: E203
+
+
+class MockFileServer:
+    def __init__(self, files: dict):
+        self.files = files
+        self.ranges = []
+
+    def head(self, url, headers=None, allow_redirects=False):
+        return MockFileResponse(self.files[url])
+
+    def get(self, url, headers=None, stream=False):
+        if url not in self.files:
+            return MockFileResponse(b"", 404)
+        if "Range" in headers:
+            start = int(headers["Range"][len("bytes=") : -1])  # noqa: E203
+            self.ranges.append(start)
+            if start >= len(self.files[url]):
+                res = MockFileResponse(b"", 416)
+                res.headers["Content-Range"] = f"bytes */{len(self.files[url])}"
+                return res
+            return MockFileResponse(self.files[url][start:], 206)
+        return MockFileResponse(self.files[url])
+
+
+def test_download_attachments(monkeypatch, tmp_path):
+    submissions = make_submissions(3)
+    for submission in submissions:
+        _id = submission["_id"]
+        submission["_attachments"] = [
+            {
+                "filename": f"owner1/attachments/{_id}/photo {_id}.jpg",
+                "download_url": f"https://kobo/{_id}.jpg",
+            }
+        ]
+    form = create_form(monkeypatch, MockServer(submissions))
+    form.fetch_data()
+
+    files = {f"https://kobo/{i}.jpg": bytes([i]) * 100 for i in (1, 2)}
+    server = MockFileServer(files)
+    monkeypatch.setattr(form.session, "head", server.head)
+    monkeypatch.setattr(form.session, "get", server.get)
+
+    # The download of the file of the submission 2 was interrupted
+    os.makedirs(tmp_path / "2")
+    with open(tmp_path / "2" / "photo 2.jpg.part", "wb") as f:
+        f.write(bytes([2]) * 40)
+
+    manifest = form.download_attachments(str(tmp_path), chunk_size=30)
+
+    assert list(manifest["_index"]) == [1, 2, 3]
+    assert list(manifest["status"]) == ["downloaded", "resumed", "failed"]
+    assert list(manifest["size"].fillna(0)) == [100, 100, 0]
+    assert server.ranges == [40]
+    with open(tmp_path / "2" / "photo 2.jpg", "rb") as f:
+        assert f.read() == files["https://kobo/2.jpg"]
+    assert not os.path.exists(tmp_path / "2" / "photo 2.jpg.part")
+
+    manifest = form.download_attachments(str(tmp_path), rows=form.data["_id"] < 3)
+    assert list(manifest["status"]) == ["skipped", "skipped"]
+    assert manifest["path"][0] == os.path.join(str(tmp_path), "1", "photo 1.jpg")
+
+
+def test_export(monkeypatch, tmp_path):
+    ds = pytest.importorskip("pyarrow.dataset")
+    monkeypatch.setitem(globals(), "data_asset", nested_asset())
+    server = MockServer(make_nested_submissions(4))
+    form = create_form(monkeypatch, server)
+    form.fetch_data()
+
+    assert form.export(str(tmp_path)) == {"data": 4, "children": 4, "toys": 8}
+    assert sorted(os.listdir(tmp_path / "data"))[0] == "submission_date=2022-12-01"
+
+    server.submissions = make_nested_submissions(6)
+    form.fetch_new_data(since="2022-12-04T10:00:00")
+    assert form.export(str(tmp_path)) == {"data": 2, "children": 2, "toys": 4}
+    # Nothing new
+    assert form.export(str(tmp_path)) == {"data": 0, "children": 0, "toys": 0}
+
+    data = ds.dataset(tmp_path / "data", partitioning="hive").to_table().to_pandas()
+    data = data.sort_values("_id")
+    assert list(data["_id"]) == [1, 2, 3, 4, 5, 6]
+    assert str(data["age_hhh"].dtype) == "int64"
+    assert str(data["_submission_time"].dtype) == "datetime64[ns, UTC]"
+    assert data["_attachments"].tolist() == ["[]"] * 6
+
+    toys = ds.dataset(tmp_path / "toys", partitioning="hive").to_table().to_pandas()
+    assert sorted(toys["_submission__id"]) == [2, 2, 2, 2, 4, 4, 4, 4, 6, 6, 6, 6]
+
+
+def test_export_display(monkeypatch, tmp_path):
+    ds = pytest.importorskip("pyarrow.dataset")
+    server = MockServer(make_submissions(4))
+    form = create_form(monkeypatch, server)
+    form.fetch_data()
+    form.export(str(tmp_path))
+
+    # The files are written with the names, however the data are displayed
+    server.submissions = make_submissions(6)
+    form.display(columns_as="label", choices_as="label")
+    form.fetch_new_data(since=4, watermark="_id")
+    assert form.export(str(tmp_path)) == {"data": 2, "children": 2}
+    assert "Consent obtained" in form.data.columns
+
+    data = ds.dataset(tmp_path / "data", partitioning="hive").to_table().to_pandas()
+    data = data.sort_values("_id")
+    assert list(data["age_hhh"]) == [30, 31, 32, 33, 34, 35]
+    assert list(data["consent"]) == ["yes", "no"] * 3
+    assert list(data["assets"]) == ["radio|phone"] * 6
+    children = ds.dataset(tmp_path / "children").to_table().to_pandas()
+    assert sorted(children["school"]) == ["no", "no", "no", "yes", "yes", "yes"]
+
+
+def test_export_arrow(monkeypatch, tmp_path):
+    ds = pytest.importorskip("pyarrow.dataset")
+    form = create_form(monkeypatch, MockServer(make_submissions(3)))
+    form.fetch_data(categorical=True)
+    form.export(str(tmp_path), format="arrow", partition_by_date=False)
+
+    data = ds.dataset(tmp_path / "data", format="ipc").to_table()
+    assert data.num_rows == 3
+    assert (
+        str(data.schema.field("consent").type)
+        == "dictionary<values=string, indices=int32, ordered=0>"
+    )
+
+    with pytest.raises(ValueError, match="'csv' is not an accepted value"):
+        form.export(str(tmp_path), format="csv")
+
+
+def test_download_attachments_complete_part(monkeypatch, tmp_path):
+    submissions = make_submissions(2)
+    for submission in submissions:
+        _id = submission["_id"]
+        submission["_attachments"] = [
+            {
+                "filename": f"owner1/attachments/{_id}/photo.jpg",
+                "download_url": f"https://kobo/{_id}.jpg",
+            }
+        ]
+    form = create_form(monkeypatch, MockServer(submissions))
+    form.fetch_data()
+
+    files = {f"https://kobo/{i}.jpg": bytes([i]) * 100 for i in (1, 2)}
+    server = MockFileServer(files)
+    monkeypatch.setattr(form.session, "head", server.head)
+    monkeypatch.setattr(form.session, "get", server.get)
+
+    # The file of the submission 1 was downloaded but not renamed, and the one of
+    # the submission 2 is longer than the file on the server (the file has changed)
+    for _id, size in [(1, 100), (2, 120)]:
+        os.makedirs(tmp_path / str(_id))
+        with open(tmp_path / str(_id) / "photo.jpg.part", "wb") as f:
+            f.write(bytes([_id]) * size)
+
+    manifest = form.download_attachments(str(tmp_path))
+
+    assert list(manifest["status"]) == ["resumed", "downloaded"]
+    assert list(manifest["size"]) == [100, 100]
+    for _id in (1, 2):
+        with open(tmp_path / str(_id) / "photo.jpg", "rb") as f:
+            assert f.read() == files[f"https://kobo/{_id}.jpg"]
+        assert not os.path.exists(tmp_path / str(_id) / "photo.jpg.part")
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pykobo.geo import parse_geopoints, parse_geotraces, to_geometry
+
+
+def test_parse_geopoints():
+    values = pd.Series(
+        ["12.5 -1.25 300 5", np.nan, "1 2", "a 2 3 4 5", ""], index=[5, 6, 7, 8, 9]
+    )
+    coords = parse_geopoints(values)
+
+    assert coords.dtype == "float64"
+    np.testing.assert_array_equal(coords[0], [12.5, -1.25, 300, 5])
+    assert np.isnan(coords[1]).all()
+    np.testing.assert_array_equal(coords[2][:2], [1, 2])
+    assert np.isnan(coords[2][2:]).all()
+    assert np.isnan(coords[3][0]) and coords[3][3] == 4
+    assert np.isnan(coords[4]).all()
+
+
+def test_parse_geopoints_empty_column():
+    assert np.isnan(parse_geopoints(pd.Series([np.nan, np.nan]))).all()
+
+
+def test_parse_geotraces():
+    values = pd.Series(["1 2 0 0;3 4 0 0", np.nan, "5 6 0 0;"])
+    coords, rows = parse_geotraces(values)
+
+    np.testing.assert_array_equal(coords[:, 0], [1, 3, 5])
+    np.testing.assert_array_equal(rows, [0, 0, 2])
+
+
+def test_to_geometry():
+    pytest.importorskip("shapely")
+    points = to_geometry(pd.Series(["12.5 -1.25 300 5", np.nan]), "geopoint")
+    assert (points[0].x, points[0].y) == (-1.25, 12.5)
+    assert points[1] is None
+
+    traces = to_geometry(pd.Series([np.nan, "1 2 0 0;3 4 0 0", "1 2 0 0"]), "geotrace")
+    assert traces[0] is None
+    assert list(traces[1].coords) == [(2, 1), (4, 3)]
+    assert traces[2] is None
+
+    shape = "0 0 0 0;0 1 0 0;1 1 0 0;0 0 0 0"
+    shapes = to_geometry(pd.Series([shape, "0 0 0 0;0 1 0 0"]), "geoshape")
+    assert shapes[0].area == 0.5
+    assert shapes[1] is None
@@ -1,9 +1,12 @@
 import json
+import time
 
 import pytest
 import requests
+from requests.adapters import HTTPAdapter
 
 from pykobo.manager import Manager
+from pykobo.session import RateLimitedAdapter
 
 URL_KOBO = "https://kf.kobotoolbox.org/api/v2"
 API_VERSION = 2
@@ -32,6 +35,10 @@ class MockResponse:
         self.json_body = json_body
         self.status_code = status_code
 
+    @property
+    def content(self):
+        return json.dumps(self.json_body).encode()
+
     def json(self):
         return self.json_body
 
@@ -39,7 +46,7 @@ class MockResponse:
 def test_fetch_forms(monkeypatch):
 
     monkeypatch.setattr(
-        requests,
+        km.session,
         "get",
         lambda *args, **kwargs: MockResponse(
             {"results": data_manager["input"]["results"]}, 200
@@ -52,7 +59,7 @@ def test_fetch_forms(monkeypatch):
 def test_fetch_forms_fail(monkeypatch):
 
     monkeypatch.setattr(
-        requests,
+        km.session,
         "get",
         lambda *args, **kwargs: MockResponse(
             {"results": data_manager["input"]["results"]}, 500
@@ -60,5 +67,149 @@ def test_fetch_forms_fail(monkeypatch):
     )
 
     # If we get an HTTP status code different from 200,
-    # return an empty list
-    assert km._fetch_forms() == []
+    # return None (unlike an empty list of forms)
+    assert km._fetch_forms() is None
+    assert km.get_forms() == []
+
+
+def test_session_shared_with_forms():
+    with open("./tests/data_form.json") as f:
+        data_form = json.load(f)
+
+    kform = km._create_koboform(data_form)
+    assert kform.session is km.session
+
+
+def test_session_retries():
+    adapter = km.session.get_adapter(URL_KOBO)
+    assert adapter.max_retries.total == 3
+    assert 502 in adapter.max_retries.status_forcelist
+    assert 429 in adapter.max_retries.status_forcelist
+
+
+def test_sync_forms(monkeypatch):
+    with open("./tests/data_asset.json") as f:
+        data_asset = json.load(f)
+
+    def get(url, **kwargs):
+        if url.endswith("/assets.json"):
+            return MockResponse({"results": [data_asset]}, 200)
+        if url == data_asset["url"]:
+            return MockResponse(data_asset, 200)
+        if url == data_asset["data"]:
+            submission = {"_id": 1, "household/gps": "1 2 3 4"}
+            return MockResponse({"next": None, "results": [submission]}, 200)
+        return MockResponse({}, 404)
+
+    manager = Manager(url=URL_KOBO, api_version=API_VERSION, token=MYTOKEN)
+    monkeypatch.setattr(manager.session, "get", get)
+
+    results = {r.uid: r for r in manager.sync_forms([data_asset["uid"], "unknown"])}
+
+    assert list(results[data_asset["uid"]].form.data["_id"]) == [1]
+    assert results[data_asset["uid"]].error is None
+    assert results["unknown"].form is None
+    assert isinstance(results["unknown"].error, ValueError)
+
+
+def test_session_rate_limit(monkeypatch):
+    monkeypatch.setattr(HTTPAdapter, "send", lambda *args, **kwargs: None)
+    adapter = RateLimitedAdapter(rate_limit=20)
+
+    start = time.monotonic()
+    for _ in range(3):
+        adapter.send(requests.Request("GET", URL_KOBO).prepare())
+    assert time.monotonic() - start >= 0.1
+
+
+def test_fetch_forms_pages(monkeypatch):
+    results = data_manager["input"]["results"]
+    calls = []
+
+    def get(url, params=None, **kwargs):
+        calls.append((url, params))
+        if url.endswith("/assets.json"):
+            return MockResponse({"next": f"{url}?page=2", "results": results[:1]}, 200)
+        return MockResponse({"next": None, "results": results[1:]}, 200)
+
+    manager = Manager(url=URL_KOBO, api_version=API_VERSION, token=MYTOKEN)
+    monkeypatch.setattr(manager.session, "get", get)
+
+    assert manager._fetch_forms() == data_manager["output"]["results"]
+    assert calls[0][1] == {"q": "asset_type:survey", "limit": 100}
+    assert calls[1] == (f"{URL_KOBO}/api/v2/assets.json?page=2", None)
+
+
+def test_get_form_cache(monkeypatch):
+    with open("./tests/data_asset.json") as f:
+        data_asset = json.load(f)
+    listing = {k: v for k, v in data_asset.items() if k != "content"}
+    calls = []
+
+    def get(url, **kwargs):
+        calls.append(url)
+        if url.endswith("/assets.json"):
+            return MockResponse({"results": [listing]}, 200)
+        if url.endswith("/assets/new.json"):
+            return MockResponse(dict(data_asset, uid="new"), 200)
+        return MockResponse({}, 404)
+
+    manager = Manager(url=URL_KOBO, api_version=API_VERSION, token=MYTOKEN)
+    monkeypatch.setattr(manager.session, "get", get)
+
+    assert manager.get_form(data_asset["uid"]).uid == data_asset["uid"]
+    assert manager.get_form(data_asset["uid"]).uid == data_asset["uid"]
+    assert len(calls) == 1
+
+    # A form missing from the list is fetched directly, with its content
+    new_form = manager.get_form("new")
+    assert new_form._has_asset()
+    assert "new" in [f.uid for f in manager.get_forms()]
+    with pytest.raises(ValueError, match="There is no form with the uid: unknown."):
+        manager.get_form("unknown")
+    assert len(calls) == 3
+
+    # The list is fetched again once expired or invalidated
+    manager.forms_ttl = 0
+    time.sleep(0.01)
+    manager.get_forms()
+    assert len(calls) == 4
+    manager.forms_ttl = None
+    manager.invalidate_forms()
+    manager.get_forms()
+    assert len(calls) == 5
+
+
+def test_get_forms_cache_empty(monkeypatch):
+    calls = []
+
+    def get(url, **kwargs):
+        calls.append(url)
+        return MockResponse({"results": []}, 200)
+
+    manager = Manager(url=URL_KOBO, api_version=API_VERSION, token=MYTOKEN)
+    monkeypatch.setattr(manager.session, "get", get)
+
+    # An account without forms is cached too
+    assert manager.get_forms() == []
+    assert manager.get_forms() == []
+    assert len(calls) == 1
+
+
+def test_get_forms_error_not_cached(monkeypatch):
+    with open("./tests/data_asset.json") as f:
+        data_asset = json.load(f)
+    responses = [MockResponse({}, 500), MockResponse({"results": [data_asset]}, 200)]
+
+    def get(url, **kwargs):
+        return responses.pop(0)
+
+    manager = Manager(url=URL_KOBO, api_version=API_VERSION, token=MYTOKEN)
+    monkeypatch.setattr(manager.session, "get", get)
+
+    # The error isn't cached as an account without forms
+    assert manager.get_forms() == []
+    assert manager._assets is None
+    assert [f.uid for f in manager.get_forms()] == [data_asset["uid"]]
+    assert [f.uid for f in manager.get_forms()] == [data_asset["uid"]]
+    assert not responses
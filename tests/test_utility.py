@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pykobo import utility
+
+
+def make_df() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "name": [" Alice. ", "bob", np.nan, "carol"],
+            "village": ["Kaya", "kaya ", "Kya", "Ouaga"],
+            "count": [1, np.nan, 3, 4],
+            "tags": [[1], [], [2], []],
+            "other": ["x", np.nan, "y", "z"],
+            "other_details": ["a", "b", "c", "d"],
+        }
+    )
+
+
+def test_trim_columns_values():
+    df = make_df()
+    trimmed = utility.trim_columns_values(df)
+
+    assert trimmed["name"].tolist()[:2] == ["Alice", "bob"]
+    assert pd.isna(trimmed["name"][2])
+    assert trimmed["tags"].tolist() == df["tags"].tolist()
+    # The DataFrame isn't modified
+    assert df["name"][0] == " Alice. "
+
+
+def test_reconcile_columns():
+    df = make_df()
+    utility.reconcile_columns(df, "other", "other_details", "reconciled")
+    assert df["reconciled"].tolist() == ["x", "b", "y", "z"]
+    assert "other" not in df.columns
+
+    df = make_df()
+    utility.reconcile_columns(df, "other", "other_details", "reconciled", "y")
+    assert df["reconciled"].tolist()[2:] == ["c", "z"]
+
+
+def test_reconcile_columns_append():
+    df = pd.DataFrame({"a": ["other: X", "yes", np.nan], "b": ["goat", "cow", "pig"]})
+    utility.reconcile_columns_append(df, "a", "b", "new", "X")
+    assert df["new"].tolist()[:2] == ["other: goat", "yes"]
+
+
+def test_fix_typos():
+    df = make_df()
+    utility.fix_typos(df, "village", [("Kya", "kaya"), ("kaya", "Kaya")])
+    assert df["village"].tolist() == ["Kaya", "kaya ", "Kaya", "Ouaga"]
+
+
+def test_clean():
+    spec = {
+        "trim": True,
+        "lowercase": ["village"],
+        "typos": {"village": [("kya", "kaya")]},
+        "fillna": ["count"],
+        "toint": ["count"],
+        "reconcile": [
+            {"col1": "other", "col2": "other_details", "new_column": "reconciled"}
+        ],
+        "columns": ["name", "village", "count", "reconciled"],
+    }
+    df = utility.clean(make_df(), spec)
+
+    assert list(df.columns) == ["name", "village", "count", "reconciled"]
+    assert df["village"].tolist() == ["kaya", "kaya", "kaya", "ouaga"]
+    assert df["count"].tolist() == [1, 0, 3, 4]
+    assert df["reconciled"].tolist() == ["x", "b", "y", "z"]
+
+    with pytest.raises(ValueError, match="'strip' is not an accepted operation"):
+        utility.clean(make_df(), {"strip": True})